@@ -0,0 +1,119 @@
+import asyncio
+import time
+from collections import deque
+
+POLITICAS = ("pular", "recuperar")
+
+class AgendadorCiclo:
+    """Ciclos em prazos fixos (início + k*período), sem deriva.
+
+    `esperar()` dorme até o próximo prazo e retorna o tempo nominal do ciclo
+    (k*período, somado ao tempo acumulado até a última troca de período), que
+    deve ser usado como tempo da simulação: o dt visto pelos controladores fica
+    exato. O fim da espera é ativo (`margem_ativa`; `margem_async` em
+    `esperar_async`), o que permite períodos de ~1 ms apesar da imprecisão
+    do time.sleep e do event loop.
+
+    Quando o trabalho passa do prazo do ciclo seguinte:
+    - "recuperar": os ciclos atrasados rodam em seguida, sem espera, até
+      alcançar o relógio (acima de `max_recuperacao` ciclos, pula o excesso);
+    - "pular": os prazos perdidos são descartados e o próximo ciclo é o
+      primeiro prazo ainda no futuro.
+    """
+    def __init__(self, periodo, politica="pular", margem_ativa=0.0005, margem_async=0.002,
+                 max_recuperacao=100, historico=1000):
+        if not periodo > 0:
+            raise ValueError(f"Período inválido: {periodo}")
+        if politica not in POLITICAS:
+            raise ValueError(f"Política desconhecida: {politica} (use {', '.join(POLITICAS)})")
+        self.periodo = periodo
+        self.politica = politica
+        self.margem_ativa = margem_ativa
+        self.margem_async = margem_async
+        self.max_recuperacao = max_recuperacao
+        self.inicio = None
+        self.k = 0
+        self.t_base = 0.0  # Tempo nominal do ciclo k = 0
+        self.ciclos = 0
+        self.perdidos = 0  # Ciclos que começaram depois do próprio prazo
+        self.pulados = 0  # Ciclos descartados pela política
+        self.atrasos = deque(maxlen=historico)  # (ciclo, atraso em s) dos prazos perdidos
+        self.ultimo_atraso = 0.0  # Atraso do último despertar em relação ao prazo (s)
+
+    def esperar(self):
+        """Espera o prazo do próximo ciclo e retorna o tempo nominal dele (s)"""
+        prazo = self._avancar()
+        if prazo is not None:
+            self._dormir_ate(prazo)
+            self.ultimo_atraso = time.perf_counter() - prazo
+        return self.t_base + self.k * self.periodo
+
+    async def esperar_async(self):
+        """Como `esperar()`, mas cede o event loop durante a espera.
+
+        O event loop acorda com resolução de ~1 ms, então o sleep termina
+        `margem_async` antes do prazo; o resto é espera ativa que ainda cede
+        o loop a cada volta (as outras etapas seguem rodando).
+        """
+        prazo = self._avancar()
+        if prazo is not None:
+            restante = prazo - time.perf_counter() - self.margem_async
+            if restante > 0:
+                await asyncio.sleep(restante)
+            while time.perf_counter() < prazo:
+                await asyncio.sleep(0)
+            self.ultimo_atraso = time.perf_counter() - prazo
+        return self.t_base + self.k * self.periodo
+
+    def _avancar(self):
+        """Passa ao próximo ciclo aplicando a política; retorna o prazo dele (None no primeiro)"""
+        agora = time.perf_counter()
+        self.ciclos += 1
+        if self.inicio is None:
+            self.inicio = agora
+            self.ultimo_atraso = 0.0
+            return None
+
+        self.k += 1
+        prazo = self.inicio + self.k * self.periodo
+        atraso = agora - prazo
+        if atraso > 0:
+            self.perdidos += 1
+            self.atrasos.append((self.k, atraso))
+            atrasados = int(atraso // self.periodo)  # Prazos seguintes que também já passaram
+            if self.politica == "pular" or atrasados > self.max_recuperacao:
+                descartar = atrasados + 1 if self.politica == "pular" else atrasados - self.max_recuperacao
+                self.k += descartar
+                self.pulados += descartar
+                prazo = self.inicio + self.k * self.periodo
+        return prazo
+
+    def _dormir_ate(self, prazo):
+        restante = prazo - time.perf_counter() - self.margem_ativa
+        if restante > 0:
+            time.sleep(restante)
+        while time.perf_counter() < prazo:
+            pass
+
+    def reancorar(self):
+        """O ciclo atual passa a vencer agora (ex.: ao sair de uma pausa)"""
+        if self.inicio is not None:
+            self.inicio = time.perf_counter() - self.k * self.periodo
+
+    def alterar_periodo(self, periodo):
+        """Novo período a partir do ciclo atual, sem salto no tempo nominal"""
+        if not periodo > 0:
+            raise ValueError(f"Período inválido: {periodo}")
+        if self.inicio is not None:
+            self.t_base += self.k * self.periodo
+            self.k = 0
+            self.inicio = time.perf_counter()
+        self.periodo = periodo
+
+    def resumo(self):
+        return {
+            "ciclos": self.ciclos,
+            "prazos_perdidos": self.perdidos,
+            "ciclos_pulados": self.pulados,
+            "maior_atraso_ms": max((a for _, a in self.atrasos), default=0.0) * 1000,
+        }
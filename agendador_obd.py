@@ -0,0 +1,119 @@
+import time
+
+# Taxas alvo (Hz) por sensor: dinâmicos rápidos, térmicos e nível devagar
+TAXAS_PADRAO = {
+    'rpm': 20,
+    'map': 20,
+    'throttle': 20,
+    'speed': 10,
+    'maf': 10,
+    'o2_b1s1': 10,
+    'timing': 10,
+    'spark_advance': 5,
+    'wideband': 10,
+    'boost': 10,
+    'o2_b1s2': 2,
+    'egr': 2,
+    'fuel_pressure': 1,
+    'fuel_rate': 1,
+    'iat': 1,
+    'ect': 0.5,
+    'cat_temp': 0.5,
+    'voltage': 0.5,
+    'dtc_status': 0.2,
+    'fuel_level': 0.1,
+}
+
+class AgendadorOBD:
+    """Escalonador de leituras OBD por taxa alvo de cada PID.
+
+    A cada execução consulta os PIDs vencidos, do mais atrasado (relativo ao
+    próprio período) ao menos atrasado, agrupando PIDs Mode 01 quando o leitor
+    aceita multi-PID. Guarda o último valor de cada PID com o instante da leitura.
+    """
+    def __init__(self, reader, taxas=None, taxa_padrao=1.0):
+        self.reader = reader
+        self.taxas = {**TAXAS_PADRAO, **(taxas or {})}
+        self.taxa_padrao = taxa_padrao
+        self.proximo = {}  # nome -> instante da próxima leitura
+        self.ultimo = {}  # nome -> (valor, instante da leitura)
+        self.leituras = {}  # nome -> quantidade de leituras
+        self.inicio = None
+
+    def periodo(self, nome):
+        return 1.0 / self.taxas.get(nome, self.taxa_padrao)
+
+    def executar(self, nomes, orcamento=None):
+        """Consulta os PIDs vencidos.
+
+        Sem orçamento, cada PID vencido é lido uma vez. Com orçamento (s), o
+        barramento fica ocupado até o fim dele, repetindo os PIDs rápidos.
+        """
+        agora = time.monotonic()
+        if self.inicio is None:
+            self.inicio = agora
+        limite = None if orcamento is None else agora + orcamento
+        feitos = set()
+
+        while True:
+            agora = time.monotonic()
+            if limite is not None and agora >= limite:
+                break
+            vencidos = [n for n in self._por_urgencia(nomes, agora)
+                        if self.proximo.get(n, agora) <= agora and n not in feitos]
+            if not vencidos:
+                if limite is None:
+                    break
+                # Espera o próximo vencimento sem passar do orçamento
+                espera = min(self.proximo.get(n, agora) for n in nomes) - agora
+                time.sleep(max(0.0, min(espera, limite - agora)))
+                continue
+
+            lote = self._montar_lote(vencidos, nomes, agora, feitos)
+            valores = self.reader.consultar(lote)
+            instante = time.monotonic()
+            for nome in lote:
+                if nome in valores:
+                    self.ultimo[nome] = (valores[nome], instante)
+                self.leituras[nome] = self.leituras.get(nome, 0) + 1
+                # Mantém a cadência; se ficou mais de um período atrás, realinha
+                proximo = self.proximo.get(nome, agora) + self.periodo(nome)
+                self.proximo[nome] = proximo if proximo > instante else instante
+                if limite is None:
+                    feitos.add(nome)
+
+    def _por_urgencia(self, nomes, agora):
+        """Ordena por atraso normalizado pelo período (maior primeiro)"""
+        return sorted(nomes, key=lambda n: ((agora - self.proximo.get(n, agora)) / self.periodo(n),
+                                            self.taxas.get(n, self.taxa_padrao)),
+                      reverse=True)
+
+    def _montar_lote(self, vencidos, nomes, agora, feitos):
+        primeiro = vencidos[0]
+        if not self.reader.elegivel_multi_pid(primeiro):
+            return [primeiro]
+
+        # Completa a requisição com outros vencidos e, se sobrar espaço,
+        # com PIDs a menos de meio período do vencimento (custo quase nulo)
+        candidatos = vencidos + [n for n in self._por_urgencia(nomes, agora)
+                                 if n not in vencidos and n not in feitos and
+                                 self.proximo.get(n, agora) - agora < 0.5 * self.periodo(n)]
+        lote = [n for n in candidatos if self.reader.elegivel_multi_pid(n)]
+        return lote[:self.reader.max_pids_por_requisicao]
+
+    def valores(self, nomes=None):
+        """Último valor de cada PID"""
+        return {n: v for n, (v, _) in self.ultimo.items() if nomes is None or n in nomes}
+
+    def ultimos(self, nomes=None):
+        """{nome: (valor, idade em segundos)} do último valor de cada PID"""
+        agora = time.monotonic()
+        return {n: (v, agora - t) for n, (v, t) in self.ultimo.items()
+                if nomes is None or n in nomes}
+
+    def taxas_obtidas(self):
+        """Leituras por segundo de cada PID desde a primeira execução"""
+        if self.inicio is None:
+            return {}
+        decorrido = max(time.monotonic() - self.inicio, 1e-9)
+        return {n: c / decorrido for n, c in self.leituras.items()}
@@ -0,0 +1,272 @@
+import argparse
+import math
+import os
+import time
+import numpy as np
+import pandas as pd
+from mapas_base import Mapa2D, _eixo_numerico, criar_mapa_ve_base, criar_mapa_lambda_base
+from replay_controle import COLUNAS_LAMBDA, _numerico, lambda_medido
+
+LINHAS_POR_LOTE = 200_000
+
+# Colunas lidas do log (as demais nem são carregadas)
+COLUNAS_AUTOTUNE = ("timestamp", "rpm", "tps", "ve", "lambda_alvo", "corr_lambda",
+                    "knock", "ect", "temp_motor") + COLUNAS_LAMBDA
+
+def _ordenar_mapa(df):
+    """Mapa com eixos crescentes e os eixos numéricos (linhas = RPM, colunas = TPS)"""
+    x, y = _eixo_numerico(df.index), _eixo_numerico(df.columns)
+    if len(x) < 2 or len(y) < 2:
+        raise ValueError("O autotune precisa de pelo menos dois pontos em cada eixo")
+    ox, oy = np.argsort(x), np.argsort(y)
+    return df.iloc[ox, oy], x[ox], y[oy]
+
+def _celulas(valores, eixo):
+    """Célula inferior (digitize) e fração até a próxima, saturada nas bordas como o Mapa2D"""
+    i = np.clip(np.digitize(valores, eixo) - 1, 0, len(eixo) - 2)
+    f = np.clip((valores - eixo[i]) / (eixo[i + 1] - eixo[i]), 0.0, 1.0)
+    return i, f
+
+class AutotuneMapas:
+    """Propõe mapas VE e lambda a partir de logs, lidos em lotes.
+
+    Cada amostra em regime (sem transiente recente, motor aquecido, lambda
+    plausível) distribui seu peso pelas quatro células vizinhas da grade
+    RPM x TPS com os pesos da interpolação bilinear: quanto mais perto da
+    célula, mais ela conta. Os acumuladores por célula (somas ponderadas do
+    fator de VE, do seu quadrado, do lambda medido e do knock) são tudo o que
+    fica em memória, então o tamanho do log não importa.
+
+    Fator de VE de uma amostra = lambda medido / lambda alvo, vezes a
+    correção da malha de lambda quando ela já estava no pulso: mistura pobre
+    (lambda > alvo) indica mais ar do que o mapa supõe. O mapa lambda só é
+    enriquecido onde houve knock.
+    """
+    def __init__(self, mapa_ve=None, mapa_lambda=None, limite_tps_s=40.0, limite_rpm_s=1500.0,
+                 espera_transiente_s=0.3, ect_minima=70.0, faixa_lambda=(0.6, 1.6),
+                 corr_no_pulso=True, peso_minimo=3.0, peso_referencia=20.0, tolerancia=0.05,
+                 ajuste_maximo=0.2, limiar_knock=0.5, enriquecimento_knock=0.05, lambda_minimo=0.78):
+        mapa_ve = criar_mapa_ve_base() if mapa_ve is None else mapa_ve
+        mapa_lambda = criar_mapa_lambda_base() if mapa_lambda is None else mapa_lambda
+        self.mapa_ve, self.eixo_rpm, self.eixo_tps = _ordenar_mapa(mapa_ve)
+        self.mapa_lambda, eixo_rpm, eixo_tps = _ordenar_mapa(mapa_lambda)
+        if not (np.array_equal(eixo_rpm, self.eixo_rpm) and np.array_equal(eixo_tps, self.eixo_tps)):
+            raise ValueError("Mapas VE e lambda precisam da mesma grade RPM x TPS")
+        self._ve = Mapa2D(self.eixo_rpm, self.eixo_tps, self.mapa_ve.values)
+        self._lambda = Mapa2D(self.eixo_rpm, self.eixo_tps, self.mapa_lambda.values)
+
+        self.limite_tps_s = limite_tps_s
+        self.limite_rpm_s = limite_rpm_s
+        self.espera_transiente_s = espera_transiente_s
+        self.ect_minima = ect_minima
+        self.faixa_lambda = faixa_lambda
+        self.corr_no_pulso = corr_no_pulso
+        self.peso_minimo = peso_minimo
+        self.peso_referencia = peso_referencia
+        self.tolerancia = tolerancia
+        self.ajuste_maximo = ajuste_maximo
+        self.limiar_knock = limiar_knock
+        self.enriquecimento_knock = enriquecimento_knock
+        self.lambda_minimo = lambda_minimo
+
+        celulas = len(self.eixo_rpm) * len(self.eixo_tps)
+        self._somas = {nome: np.zeros(celulas) for nome in
+                       ("peso", "fator", "fator2", "lambda", "knock", "amostras")}
+        self.contadores = {"linhas": 0, "usadas": 0, "transientes": 0, "frias": 0,
+                           "invalidas": 0, "segundos": 0.0}
+        self.novo_log()
+
+    def novo_log(self):
+        """Esquece a amostra anterior (o próximo lote é o começo de outro log)"""
+        self._anterior = None  # (timestamp, rpm, tps) da última linha do lote anterior
+        self._ultimo_transiente = -math.inf
+
+    def _transientes(self, t, rpm, tps):
+        """Máscara das amostras em regime; o estado entre lotes fica em _anterior/_ultimo_transiente"""
+        if self._anterior is not None:
+            t0, rpm0, tps0 = self._anterior
+        else:
+            t0, rpm0, tps0 = (math.nan,) * 3
+        dt = np.diff(t, prepend=t0)
+        avanca = dt > 0  # Primeira linha do log, timestamp repetido ou recomeçado: sem derivada
+        with np.errstate(divide="ignore", invalid="ignore"):
+            transiente = avanca & ((np.abs(np.diff(tps, prepend=tps0)) > self.limite_tps_s * dt) |
+                                   (np.abs(np.diff(rpm, prepend=rpm0)) > self.limite_rpm_s * dt))
+        # Instante do último transiente até cada amostra (ou do lote anterior); um
+        # timestamp que volta (log recomeçado) conta como transiente
+        evento = transiente | (dt < 0)
+        ultimo = np.maximum.accumulate(np.where(evento, np.arange(len(t)), -1))
+        marcas = np.where(ultimo >= 0, t[ultimo], self._ultimo_transiente)
+        if len(t):
+            self._anterior = (t[-1], rpm[-1], tps[-1])
+            self._ultimo_transiente = marcas[-1]
+        return avanca & (t - marcas >= self.espera_transiente_s), int(transiente.sum())
+
+    def acumular(self, df):
+        """Processa um lote de linhas do log (na ordem em que foram gravadas)"""
+        inicio = time.perf_counter()
+        for obrigatoria in ("timestamp", "rpm", "tps"):
+            if obrigatoria not in df.columns:
+                raise ValueError(f"Log sem a coluna '{obrigatoria}'")
+        lambdas = lambda_medido(df)
+        if lambdas is None:
+            raise ValueError(f"Log sem lambda medido (uma das colunas {', '.join(COLUNAS_LAMBDA)})")
+        t, rpm, tps = (_numerico(df[c]) for c in ("timestamp", "rpm", "tps"))
+        n = len(df)
+
+        regime, transientes = self._transientes(t, rpm, tps)
+        ect = next((_numerico(df[c]) for c in ("ect", "temp_motor") if c in df.columns), None)
+        quente = ect >= self.ect_minima if ect is not None else np.ones(n, dtype=bool)
+        # Colunas ausentes ou zeradas (logs antigos gravam ve = 0) vêm dos mapas atuais
+        ve = self._coluna_ou_mapa(df, "ve", self._ve, rpm, tps)
+        alvo = self._coluna_ou_mapa(df, "lambda_alvo", self._lambda, rpm, tps)
+        fator = lambdas / alvo
+        if self.corr_no_pulso and "corr_lambda" in df.columns:
+            corr = _numerico(df["corr_lambda"])
+            fator = fator * np.where(np.isfinite(corr), corr, 1.0)
+        knock = _numerico(df["knock"]) if "knock" in df.columns else np.zeros(n)
+
+        validas = (np.isfinite(rpm) & np.isfinite(tps) & np.isfinite(fator) & (rpm > 0) & (ve > 0) &
+                   (lambdas >= self.faixa_lambda[0]) & (lambdas <= self.faixa_lambda[1]))
+        usar = validas & regime & quente
+        self.contadores["linhas"] += n
+        self.contadores["usadas"] += int(usar.sum())
+        self.contadores["transientes"] += transientes
+        self.contadores["frias"] += int((validas & regime & ~quente).sum())
+        self.contadores["invalidas"] += int((~validas).sum())
+
+        if usar.any():
+            self._distribuir(rpm[usar], tps[usar], {
+                "fator": fator[usar],
+                "lambda": lambdas[usar],
+                "knock": (np.nan_to_num(knock[usar]) > self.limiar_knock).astype(float),
+            })
+        self.contadores["segundos"] += time.perf_counter() - inicio
+
+    @staticmethod
+    def _coluna_ou_mapa(df, coluna, mapa, rpm, tps):
+        if coluna not in df.columns:
+            return mapa.valores(rpm, tps)
+        valores = _numerico(df[coluna])
+        return np.where(valores > 0, valores, mapa.valores(rpm, tps))
+
+    def _distribuir(self, rpm, tps, grandezas):
+        """Soma cada amostra nas quatro células vizinhas com o peso bilinear (bincount)"""
+        i, fx = _celulas(rpm, self.eixo_rpm)
+        j, fy = _celulas(tps, self.eixo_tps)
+        nc = len(self.eixo_tps)
+        base = i * nc + j
+        indices = np.concatenate((base, base + 1, base + nc, base + nc + 1))
+        pesos = np.concatenate(((1 - fx) * (1 - fy), (1 - fx) * fy, fx * (1 - fy), fx * fy))
+        celulas = len(self._somas["peso"])
+
+        def somar(nome, valores=None):
+            w = pesos if valores is None else pesos * np.tile(valores, 4)
+            self._somas[nome] += np.bincount(indices, weights=w, minlength=celulas)
+
+        somar("peso")
+        somar("fator", grandezas["fator"])
+        somar("fator2", grandezas["fator"] ** 2)
+        somar("lambda", grandezas["lambda"])
+        somar("knock", grandezas["knock"])
+        # Amostras por célula: conta onde a amostra tem o maior peso
+        mais_perto = base + (fx >= 0.5) * nc + (fy >= 0.5)
+        self._somas["amostras"] += np.bincount(mais_perto, minlength=celulas)
+
+    def resultado(self):
+        """({nome: DataFrame no formato dos mapas}, resumo) com as propostas até aqui.
+
+        Tabelas: 've' e 'lambda' (propostas), 'confianca' (0 a 1), 'fator_ve',
+        'lambda_medido', 'peso' e 'amostras'. A confiança combina cobertura
+        (peso acumulado frente a peso_referencia) e consistência (desvio do
+        fator frente a tolerancia); a proposta anda só essa fração do
+        caminho até o valor medido, com o fator limitado a ±ajuste_maximo.
+        """
+        forma = (len(self.eixo_rpm), len(self.eixo_tps))
+        s = {nome: v.reshape(forma) for nome, v in self._somas.items()}
+        peso = s["peso"]
+        com_dados = peso >= self.peso_minimo
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fator = np.where(peso > 0, s["fator"] / peso, np.nan)
+            desvio = np.sqrt(np.maximum(s["fator2"] / peso - fator ** 2, 0.0))
+            lambda_medio = np.where(peso > 0, s["lambda"] / peso, np.nan)
+            taxa_knock = np.where(peso > 0, s["knock"] / peso, 0.0)
+        cobertura = peso / (peso + self.peso_referencia)
+        consistencia = 1.0 / (1.0 + (np.nan_to_num(desvio) / self.tolerancia) ** 2)
+        confianca = np.where(com_dados, cobertura * consistencia, 0.0)
+
+        passo = np.clip(np.nan_to_num(fator, nan=1.0), 1 - self.ajuste_maximo, 1 + self.ajuste_maximo) - 1
+        ve = self.mapa_ve.values * (1 + confianca * passo)
+        # Knock: enriquece proporcionalmente à fração das amostras com knock (nunca empobrece)
+        enriquecer = np.where(com_dados, cobertura * taxa_knock * self.enriquecimento_knock, 0.0)
+        lambda_ = np.maximum(self.mapa_lambda.values - enriquecer,
+                             np.minimum(self.mapa_lambda.values, self.lambda_minimo))
+
+        def tabela(valores, modelo=self.mapa_ve):
+            return pd.DataFrame(valores, index=modelo.index, columns=modelo.columns)
+
+        tabelas = {
+            "ve": tabela(ve),
+            "lambda": tabela(lambda_, self.mapa_lambda),
+            "confianca": tabela(confianca),
+            "fator_ve": tabela(fator),
+            "lambda_medido": tabela(lambda_medio),
+            "peso": tabela(peso),
+            "amostras": tabela(s["amostras"].astype(int)),
+        }
+        c = self.contadores
+        resumo = {
+            **c,
+            "linhas_por_s": c["linhas"] / c["segundos"] if c["segundos"] > 0 else 0.0,
+            "celulas_com_dados": int(com_dados.sum()),
+            "celulas": int(peso.size),
+            "celulas_ve_alteradas": int(np.sum(np.abs(ve - self.mapa_ve.values) > 1e-9)),
+            "celulas_lambda_alteradas": int(np.sum(lambda_ != self.mapa_lambda.values)),
+        }
+        return tabelas, resumo
+
+def autotune_log(caminhos, mapa_ve=None, mapa_lambda=None, linhas_por_lote=LINHAS_POR_LOTE, **opcoes):
+    """Autotune de um ou mais logs CSV, lidos em lotes de linhas_por_lote (memória limitada).
+
+    Retorna (tabelas, resumo) de `AutotuneMapas.resultado`.
+    """
+    if isinstance(caminhos, (str, os.PathLike)):
+        caminhos = [caminhos]
+    autotune = AutotuneMapas(mapa_ve, mapa_lambda, **opcoes)
+    for caminho in caminhos:
+        autotune.novo_log()
+        lotes = pd.read_csv(caminho, usecols=lambda c: c in COLUNAS_AUTOTUNE, chunksize=linhas_por_lote)
+        for lote in lotes:
+            autotune.acumular(lote)
+    return autotune.resultado()
+
+def _ler_mapa(caminho, padrao):
+    return pd.read_csv(caminho, index_col=0) if os.path.exists(caminho) else padrao()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Propõe mapas VE e lambda a partir de logs")
+    parser.add_argument("logs", nargs="*", default=["log_ecu_simulada.csv"])
+    parser.add_argument("--mapa-ve", default="mapa_ve.csv", help="Mapa VE atual (sem arquivo, o mapa base)")
+    parser.add_argument("--mapa-lambda", default="mapa_lambda.csv", help="Mapa lambda atual")
+    parser.add_argument("--lote", type=int, default=LINHAS_POR_LOTE, help="Linhas lidas por vez")
+    parser.add_argument("--sem-corr-lambda", action="store_true",
+                        help="A correção de lambda do log não estava aplicada ao pulso")
+    parser.add_argument("--aplicar", action="store_true",
+                        help="Grava as propostas sobre os mapas atuais (senão em <mapa>_autotune.csv)")
+    args = parser.parse_args()
+
+    tabelas, resumo = autotune_log(
+        args.logs, _ler_mapa(args.mapa_ve, criar_mapa_ve_base),
+        _ler_mapa(args.mapa_lambda, criar_mapa_lambda_base),
+        linhas_por_lote=args.lote, corr_no_pulso=not args.sem_corr_lambda)
+    print(f"{resumo['linhas']} linhas em {resumo['segundos']:.2f} s ({resumo['linhas_por_s']:,.0f} linhas/s); "
+          f"usadas {resumo['usadas']}, transientes {resumo['transientes']}, "
+          f"motor frio {resumo['frias']}, inválidas {resumo['invalidas']}")
+    print(f"Células com dados: {resumo['celulas_com_dados']} de {resumo['celulas']}")
+    print("\nConfiança por célula:")
+    print(tabelas["confianca"].round(2).to_string())
+    for tipo, caminho in (("ve", args.mapa_ve), ("lambda", args.mapa_lambda)):
+        raiz, ext = os.path.splitext(caminho)
+        saida = caminho if args.aplicar else f"{raiz}_autotune{ext or '.csv'}"
+        tabelas[tipo].to_csv(saida)
+        print(f"Mapa {tipo}: {resumo[f'celulas_{tipo}_alteradas']} células alteradas -> {saida}")
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import zlib
+from datetime import datetime
+
+class ArmazemBackups:
+    """Backups de mapas endereçados por conteúdo.
+
+    Cada imagem binária é gravada uma única vez, comprimida, em
+    objetos/<hash[:2]>/<hash>.z. O índice (uma linha JSON por backup, com tipo,
+    instante, VIN e hash) fica em memória: listar não abre nenhum objeto e
+    restaurar lê um único arquivo.
+    """
+    def __init__(self, diretorio="mapas_backup"):
+        self.diretorio = diretorio
+        self.caminho_indice = os.path.join(diretorio, "indice.jsonl")
+        os.makedirs(os.path.join(diretorio, "objetos"), exist_ok=True)
+        self.entradas = {}  # id -> entrada do índice, em ordem de criação
+        self._por_conteudo = {}  # (hash, tipo, vin) -> id
+        if os.path.exists(self.caminho_indice):
+            with open(self.caminho_indice, "r") as f:
+                for linha in f:
+                    try:
+                        entrada = json.loads(linha)
+                    except ValueError:
+                        continue  # Linha truncada por uma gravação interrompida
+                    # Índices antigos podiam repetir o id (mesmo segundo, outro VIN)
+                    entrada["id"] = self._id_livre(entrada["id"])
+                    self._indexar(entrada)
+
+    def _id_livre(self, base):
+        """`base`, ou `base_2`, `base_3`... se já estiver em uso"""
+        id_, n = base, 1
+        while id_ in self.entradas:
+            n += 1
+            id_ = f"{base}_{n}"
+        return id_
+
+    def _indexar(self, entrada):
+        if entrada["id"] in self.entradas:
+            raise ValueError(f"Id de backup repetido: {entrada['id']}")
+        self.entradas[entrada["id"]] = entrada
+        self._por_conteudo[(entrada["hash"], entrada["tipo"], entrada["vin"])] = entrada["id"]
+
+    def _caminho_objeto(self, hash_):
+        return os.path.join(self.diretorio, "objetos", hash_[:2], f"{hash_}.z")
+
+    def salvar(self, tipo, imagem, vin=None):
+        """Guarda a imagem; se o mesmo conteúdo já existe para o tipo/VIN, retorna a entrada existente"""
+        if vin is not None and not isinstance(vin, str):
+            raise TypeError(f"VIN deve ser str (recebido {type(vin).__name__}); decodifique antes de salvar")
+        imagem = bytes(imagem)
+        hash_ = hashlib.sha256(imagem).hexdigest()
+        existente = self._por_conteudo.get((hash_, tipo, vin))
+        if existente is not None:
+            return self.entradas[existente]
+
+        caminho = self._caminho_objeto(hash_)
+        if not os.path.exists(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            temporario = caminho + ".tmp"
+            with open(temporario, "wb") as f:
+                f.write(zlib.compress(imagem, 9))
+            os.replace(temporario, caminho)
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        entrada = {
+            "id": self._id_livre(f"{tipo}_{timestamp}_{hash_[:8]}"),
+            "tipo": tipo,
+            "timestamp": timestamp,
+            "vin": vin,
+            "hash": hash_,
+            "tamanho": len(imagem),
+        }
+        with open(self.caminho_indice, "a") as f:
+            f.write(json.dumps(entrada) + "\n")
+        self._indexar(entrada)
+        return entrada
+
+    def listar(self, tipo=None, vin=None):
+        """Entradas do índice, mais recentes primeiro"""
+        return [e for e in reversed(list(self.entradas.values()))
+                if (tipo is None or e["tipo"] == tipo) and (vin is None or e["vin"] == vin)]
+
+    def carregar(self, id_backup):
+        """Imagem binária de um backup, conferida pelo hash"""
+        entrada = self.entradas.get(id_backup)
+        if entrada is None:
+            raise KeyError(f"Backup não encontrado: {id_backup}")
+        with open(self._caminho_objeto(entrada["hash"]), "rb") as f:
+            imagem = zlib.decompress(f.read())
+        if hashlib.sha256(imagem).hexdigest() != entrada["hash"]:
+            raise IOError(f"Backup corrompido: {id_backup}")
+        return imagem
@@ -0,0 +1,400 @@
+import argparse
+import json
+import math
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from config_motor import CONFIG_MOTOR
+from controle_malha_fechada import GerenciadorControle, GerenciadorControleBanco
+from downsample import reduzir_serie
+from ecu_core import ECU
+from log_tail import LogTailer
+from log_writer import LogWriter
+from replay_controle import reproduzir_log
+from autotune_mapas import autotune_log
+
+# Colunas desenhadas no painel (cada uma vira um traço reduzido)
+COLUNAS_PAINEL = ['rpm', 'tps', 'ect', 'knock', 'corr_knock', 'lambda', 'corr_lambda',
+                  'corr_marcha', 'map_kpa', 'inj_ms']
+
+def gerar_registro(i, rng):
+    """Registro sintético com as mesmas colunas do log da ECU"""
+    return {
+        'timestamp': 1748193318.0 + i * 0.5,
+        'rpm': 800 + rng.random() * 6000,
+        'tps': rng.random() * 100,
+        'map_kpa': 90 + rng.random() * 50,
+        'iat': 25.0,
+        'ect': min(90, 25.0 + i * 0.1),
+        'lambda': 0.7 + rng.random() * 0.6,
+        'knock': 0,
+        'bat': 12.0,
+        've': 0,
+        'inj_ms': 5.0,
+        'corr_marcha': 1.0,
+        'corr_lambda': 1.0,
+        'corr_knock': 0.0,
+    }
+
+def bench_log_writer(total_linhas=2000, amostras=(100, 500, 1000, 2000), seed=0):
+    """Compara custo por ciclo: reescrita completa (to_csv) x LogWriter append"""
+    rng = np.random.default_rng(seed)
+    registros = [gerar_registro(i, rng) for i in range(total_linhas)]
+    resultados = {'linhas': list(amostras), 'to_csv_ms': [], 'log_writer_ms': []}
+
+    with tempfile.TemporaryDirectory() as pasta:
+        # Caminho antigo: DataFrame do histórico inteiro a cada ciclo
+        caminho = os.path.join(pasta, "log_to_csv.csv")
+        historico = []
+        for i, registro in enumerate(registros, start=1):
+            t0 = time.perf_counter()
+            historico.append(registro)
+            pd.DataFrame(historico).to_csv(caminho, index=False)
+            dt = time.perf_counter() - t0
+            if i in amostras:
+                resultados['to_csv_ms'].append(dt * 1000)
+
+        # Caminho novo: append com buffer (média por ciclo até a amostra)
+        caminho = os.path.join(pasta, "log_append.csv")
+        with LogWriter(caminho, max_linhas=20, max_intervalo=1.0) as log:
+            t_bloco = time.perf_counter()
+            inicio_bloco = 0
+            for i, registro in enumerate(registros, start=1):
+                log.escrever(registro)
+                if i in amostras:
+                    agora = time.perf_counter()
+                    resultados['log_writer_ms'].append(
+                        (agora - t_bloco) * 1000 / (i - inicio_bloco))
+                    t_bloco, inicio_bloco = agora, i
+
+    return resultados
+
+def imprimir_tabela(titulo, resultados):
+    print(f"\n{titulo}")
+    colunas = list(resultados)
+    print(" | ".join(f"{c:>14}" for c in colunas))
+    for linha in zip(*resultados.values()):
+        print(" | ".join(f"{v:>14.3f}" if isinstance(v, float) else f"{v:>14}"
+                         for v in linha))
+
+def _mediana(preparar, executar, rodadas=5):
+    """Mediana, entre rodadas, do tempo (s) de executar(preparar())"""
+    tempos = []
+    for _ in range(rodadas):
+        estado = preparar()
+        t0 = time.perf_counter()
+        executar(estado)
+        tempos.append(time.perf_counter() - t0)
+    return float(np.median(tempos))
+
+def bench_ecu_cycle(n=5000, rodadas=5, seed=0):
+    """Custo por amostra de ECU.cycle e de ECU.cycle_batch"""
+    tempos = (np.arange(n) * 0.5).tolist()
+
+    def ciclo(ecu):
+        for t in tempos:
+            ecu.cycle(t)
+
+    preparar = lambda: ECU(CONFIG_MOTOR, seed=seed)
+    return {
+        'cycle_us': _mediana(preparar, ciclo, rodadas) / n * 1e6,
+        'cycle_batch_us': _mediana(preparar, lambda ecu: ecu.cycle_batch(tempos), rodadas) / n * 1e6,
+    }
+
+def bench_controle(n=20000, rodadas=5, seed=0):
+    """Custo por chamada de GerenciadorControle.atualizar com dados simulados"""
+    dados = ECU(CONFIG_MOTOR, seed=seed).cycle_batch(np.arange(n) * 0.5)
+    colunas = ['timestamp', 'rpm', 'lambda', 'lambda_alvo', 'knock']
+    linhas = [dict(zip(colunas, v)) for v in zip(*(dados[c].tolist() for c in colunas))]
+
+    def atualizar(controle):
+        for linha in linhas:
+            controle.atualizar(linha)
+
+    # Banco: as mesmas linhas como 1000 malhas paralelas (custo por malha-passo)
+    malhas, passos = 1000, 200
+    bloco = {c: np.resize(dados[c], (passos, malhas)) for c in colunas}
+    bloco['timestamp'] = np.arange(passos) * 0.5
+
+    def atualizar_banco(controle):
+        for k in range(passos):
+            controle.atualizar({c: bloco[c][k] for c in colunas})
+
+    return {
+        'atualizar_us': _mediana(GerenciadorControle, atualizar, rodadas) / n * 1e6,
+        'banco_malha_us': _mediana(lambda: GerenciadorControleBanco(malhas), atualizar_banco,
+                                   rodadas) / (passos * malhas) * 1e6,
+    }
+
+def gerar_log(caminho, linhas, seed=0, bloco=500_000, passo=0.5):
+    """Log sintético com as colunas do simulador, gravado em blocos"""
+    rng = np.random.default_rng(seed)
+    for inicio in range(0, linhas, bloco):
+        n = min(bloco, linhas - inicio)
+        i = np.arange(inicio, inicio + n)
+        df = pd.DataFrame({
+            # Texto com ms: o float_format '%.6g' das demais colunas achataria o tempo
+            'timestamp': np.char.mod('%.3f', 1748193318.0 + i * passo),
+            'rpm': 800 + rng.random(n) * 6000,
+            'tps': rng.random(n) * 100,
+            'map_kpa': 90 + rng.random(n) * 50,
+            'iat': 25.0,
+            'ect': np.minimum(90, 25.0 + i * 0.1),
+            'lambda': 0.7 + rng.random(n) * 0.6,
+            'knock': 0,
+            'bat': 12.0,
+            've': 0,
+            'inj_ms': 5.0,
+            'corr_marcha': 1.0,
+            'corr_lambda': 1.0,
+            'corr_knock': 0.0,
+        })
+        df.to_csv(caminho, mode='w' if inicio == 0 else 'a', header=inicio == 0,
+                  index=False, float_format='%.6g')
+
+def bench_carga_log(tamanhos=(1_000, 100_000, 10_000_000), janela=200_000, pontos=1000, seed=0):
+    """Tempo de carga do log no painel: leitura inicial, incremento e redução dos traços"""
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        for linhas in tamanhos:
+            caminho = os.path.join(pasta, f"log_{linhas}.csv")
+            gerar_log(caminho, linhas, seed)
+
+            t0 = time.perf_counter()
+            tailer = LogTailer(caminho, janela=janela)
+            df = tailer.ler()
+            resultados[f'carga_{linhas}_s'] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            x = df['tempo'].to_numpy()
+            for coluna in COLUNAS_PAINEL:
+                reduzir_serie(x, df[coluna].to_numpy(), pontos)
+            resultados[f'reducao_{linhas}_ms'] = (time.perf_counter() - t0) * 1000
+
+            # Um ciclo do painel: 20 linhas novas e leitura incremental
+            rng = np.random.default_rng(seed)
+            with LogWriter(caminho, colunas=tailer.colunas, sobrescrever=False) as log:
+                for i in range(20):
+                    log.escrever(gerar_registro(linhas + i, rng))
+            t0 = time.perf_counter()
+            tailer.ler()
+            resultados[f'incremento_{linhas}_ms'] = (time.perf_counter() - t0) * 1000
+            os.remove(caminho)
+    return resultados
+
+def bench_obd(duracao=5.0, protocolo="CAN_11_500"):
+    """Conexão fria/quente e taxa de amostras OBD contra o ELM327 emulado"""
+    from agendador_obd import AgendadorOBD
+    from emulador_elm import EmuladorELM327
+    from obd_reader import OBDReader
+
+    resultados = {}
+    with EmuladorELM327(protocolo) as emulador, tempfile.TemporaryDirectory() as pasta:
+        cache = os.path.join(pasta, "cache_veiculos.json")
+        for rodada in ("fria", "quente"):
+            leitor = OBDReader(emulador.porta, cache_path=cache)
+            leitor.connect()
+            resultados[f'conexao_{rodada}_s'] = leitor.tempo_conexao
+            if rodada == "fria":
+                leitor.connection.close()
+
+        for modo, multi_pid in (("multi_pid", True), ("simples", False)):
+            leitor.multi_pid = multi_pid
+            leitor.agendador = AgendadorOBD(leitor, leitor.agendador.taxas)
+            requisicoes = emulador.requisicoes
+            ciclos = 0
+            t0 = time.perf_counter()
+            while time.perf_counter() - t0 < duracao:
+                leitor.read_all_advanced()
+                ciclos += 1
+            decorrido = time.perf_counter() - t0
+            resultados[f'ciclos_{modo}_hz'] = ciclos / decorrido
+            resultados[f'pids_{modo}_hz'] = sum(leitor.agendador.leituras.values()) / decorrido
+            resultados[f'requisicoes_{modo}_hz'] = (emulador.requisicoes - requisicoes) / decorrido
+        leitor.connection.close()
+    return resultados
+
+def bench_mapas(celulas=10, protocolo="CAN_11_500", seed=0):
+    """Leitura da região (backup), leitura do mapa e gravação diferencial no ELM327 emulado"""
+    import obd
+    from emulador_elm import EmuladorELM327
+    from ecu_mapper import ECUMapper
+
+    rng = np.random.default_rng(seed)
+    with EmuladorELM327(protocolo) as emulador, tempfile.TemporaryDirectory() as pasta:
+        conexao = obd.OBD(emulador.porta)
+        mapper = ECUMapper(conexao, backup_dir=os.path.join(pasta, "backups"))
+
+        t0 = time.perf_counter()
+        mapper.backup_map("fuel")
+        leitura = time.perf_counter() - t0
+        bytes_s = mapper.ultima_leitura['bytes_s']
+
+        t0 = time.perf_counter()
+        mapa = mapper.read_current_map("fuel")
+        leitura_mapa = time.perf_counter() - t0
+
+        editado = mapa.copy()
+        for i in rng.choice(editado.size, celulas, replace=False):
+            editado.iat[i // editado.shape[1], i % editado.shape[1]] += 1
+        t0 = time.perf_counter()
+        relatorio = mapper.write_map("fuel", editado)
+        escrita = time.perf_counter() - t0
+        conexao.close()
+
+    return {
+        'leitura_s': leitura,
+        'leitura_bytes_s': bytes_s,
+        'leitura_mapa_s': leitura_mapa,
+        'escrita_s': escrita,
+        'escrita_transacoes': relatorio['transacoes'],
+    }
+
+def bench_log_writer_metricas():
+    """bench_log_writer achatado em métricas (ex.: log_writer_ms_2000)"""
+    tabela = bench_log_writer()
+    return {f'{caminho}_{linhas}': valor
+            for caminho in ('to_csv_ms', 'log_writer_ms')
+            for linhas, valor in zip(tabela['linhas'], tabela[caminho])}
+
+def bench_replay(linhas=360_000, seed=0):
+    """Replay da malha fechada sobre um log de 1 h a 100 Hz (leitura do CSV incluída)"""
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, 'log.csv')
+        gerar_log(caminho, linhas, seed, passo=0.01)
+        inicio = time.perf_counter()
+        _, resumo = reproduzir_log(caminho, saida=False)
+        total = time.perf_counter() - inicio
+    return {'replay_total_s': total, 'replay_linhas_hz': resumo['linhas_por_s']}
+
+def bench_autotune(linhas=2_000_000, seed=0):
+    """Autotune VE/lambda sobre um log grande, lido em lotes (leitura do CSV incluída)"""
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, 'log.csv')
+        gerar_log(caminho, linhas, seed, passo=0.01)
+        inicio = time.perf_counter()
+        # O log sintético sorteia TPS a cada linha: sem o filtro de transientes para binar tudo
+        _, resumo = autotune_log(caminho, limite_tps_s=np.inf, limite_rpm_s=np.inf)
+        total = time.perf_counter() - inicio
+    return {'autotune_total_s': total, 'autotune_linhas_hz': resumo['linhas'] / total,
+            'autotune_binning_hz': resumo['linhas_por_s']}
+
+BENCHMARKS = {
+    'ecu_cycle': bench_ecu_cycle,
+    'controle': bench_controle,
+    'log_writer': bench_log_writer_metricas,
+    'carga_log': bench_carga_log,
+    'obd': bench_obd,
+    'mapas': bench_mapas,
+    'replay': bench_replay,
+    'autotune': bench_autotune,
+}
+
+def _maior_melhor(metrica):
+    return metrica.endswith(('_hz', '_bytes_s'))
+
+def executar_suite(nomes=None, rapido=False):
+    """Roda os benchmarks e retorna {metadados, resultados}; falhas ficam registradas"""
+    resultados = {}
+    for nome in nomes or BENCHMARKS:
+        print(f"Rodando {nome}...")
+        try:
+            if rapido and nome == 'carga_log':
+                resultados[nome] = bench_carga_log(tamanhos=(1_000, 100_000))
+            elif rapido and nome == 'obd':
+                resultados[nome] = bench_obd(duracao=2.0)
+            elif rapido and nome == 'replay':
+                resultados[nome] = bench_replay(linhas=36_000)
+            elif rapido and nome == 'autotune':
+                resultados[nome] = bench_autotune(linhas=200_000)
+            else:
+                resultados[nome] = BENCHMARKS[nome]()
+        except Exception as e:
+            print(f"  {nome} falhou: {e}")
+            resultados[nome] = {'erro': str(e)}
+    return {
+        'metadados': {
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'rapido': rapido,
+        },
+        'resultados': resultados,
+    }
+
+def falhas(execucao):
+    """{benchmark: mensagem} dos benchmarks que levantaram exceção"""
+    return {nome: m['erro'] for nome, m in execucao['resultados'].items() if 'erro' in m}
+
+def comparar(atual, baseline, tolerancia=0.2):
+    """Linhas (benchmark, métrica, baseline, atual, variação, regressão) dos benchmarks rodados.
+
+    Variação é positiva quando piora (tempo maior ou taxa menor). Um
+    benchmark que falhou e, no mesmo modo (rápido ou completo) da baseline,
+    uma métrica da baseline ausente na execução atual contam como regressão
+    (valor NaN).
+    """
+    mesmo_modo = atual['metadados'].get('rapido') == baseline['metadados'].get('rapido')
+    linhas = []
+    for nome, metricas in atual['resultados'].items():
+        base = baseline['resultados'].get(nome, {})
+        if 'erro' in metricas:
+            linhas.append((nome, 'erro', math.nan, math.nan, math.inf, True))
+            continue
+        for metrica, valor in metricas.items():
+            anterior = base.get(metrica)
+            if not isinstance(valor, (int, float)) or not isinstance(anterior, (int, float)) or not anterior:
+                continue
+            variacao = valor / anterior - 1
+            if _maior_melhor(metrica):
+                variacao = anterior / valor - 1 if valor else float('inf')
+            linhas.append((nome, metrica, anterior, valor, variacao, variacao > tolerancia))
+        if mesmo_modo:
+            for metrica, anterior in base.items():
+                if metrica not in metricas and isinstance(anterior, (int, float)):
+                    linhas.append((nome, metrica, anterior, math.nan, math.inf, True))
+    return linhas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks dos caminhos críticos da ECU")
+    parser.add_argument("--apenas", help=f"Lista separada por vírgulas: {','.join(BENCHMARKS)}")
+    parser.add_argument("--rapido", action="store_true", help="Sem o log de 10M linhas e com OBD curto")
+    parser.add_argument("--saida", default="benchmark_resultados.json")
+    parser.add_argument("--baseline", default="benchmark_baseline.json")
+    parser.add_argument("--atualizar-baseline", action="store_true")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Piora relativa aceita (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    atual = executar_suite(args.apenas.split(",") if args.apenas else None, args.rapido)
+    with open(args.saida, "w") as f:
+        json.dump(atual, f, indent=2)
+    for nome, metricas in atual['resultados'].items():
+        imprimir_tabela(nome, {'métrica': list(metricas), 'valor': list(metricas.values())})
+
+    erros = falhas(atual)
+    for nome, mensagem in erros.items():
+        print(f"FALHA em {nome}: {mensagem}")
+
+    if args.atualizar_baseline:
+        if erros:
+            raise SystemExit(f"Baseline não atualizada: {len(erros)} benchmark(s) falharam")
+        with open(args.baseline, "w") as f:
+            json.dump(atual, f, indent=2)
+        print(f"\nBaseline atualizada: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            linhas = comparar(atual, json.load(f), args.tolerancia)
+        print(f"\nComparação com {args.baseline} (tolerância {args.tolerancia:.0%})")
+        for nome, metrica, anterior, valor, variacao, regressao in linhas:
+            marca = "REGRESSÃO" if regressao else ""
+            print(f"{nome:>12} {metrica:>28} {anterior:>12.4g} -> {valor:<12.4g} {variacao:+7.1%} {marca}")
+        if any(l[-1] for l in linhas):
+            raise SystemExit(1)
+    if erros:
+        raise SystemExit(1)
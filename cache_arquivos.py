@@ -0,0 +1,70 @@
+import os
+import threading
+
+def assinatura(caminho):
+    """(mtime em ns, tamanho) do arquivo, ou None se ele não existe"""
+    try:
+        stat = os.stat(caminho)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+class CacheArquivos:
+    """Resultados derivados de arquivos, reaproveitados enquanto o arquivo não muda.
+
+    A validade é a assinatura (mtime, tamanho): uma consulta sem mudança no
+    disco custa um os.stat. Quem grava o arquivo chama `invalidar()` (o mtime
+    pode não mudar dentro da resolução do sistema de arquivos). Valores que
+    não vêm de arquivo (ex.: mapas base) ficam em `calcular()`.
+
+    Os valores são compartilhados: quem os recebe não deve modificá-los.
+    """
+    def __init__(self):
+        self._arquivos = {}  # caminho absoluto -> (assinatura, valor)
+        self._calculados = {}  # nome qualificado da função -> valor
+        self._trava = threading.Lock()  # Sessões do Streamlit rodam em threads
+        self.acertos = 0
+        self.cargas = 0
+
+    def ler(self, caminho, carregar, padrao=None):
+        """`carregar(caminho)` se o arquivo mudou; sem arquivo, `padrao()` (também em cache)"""
+        atual = assinatura(caminho)
+        if atual is None:
+            return self.calcular(padrao) if padrao else None
+        chave = os.path.abspath(caminho)
+        with self._trava:
+            entrada = self._arquivos.get(chave)
+            if entrada and entrada[0] == atual:
+                self.acertos += 1
+                return entrada[1]
+        valor = carregar(caminho)
+        with self._trava:
+            self._arquivos[chave] = (atual, valor)
+            self.cargas += 1
+        return valor
+
+    def calcular(self, funcao):
+        """Resultado de `funcao()` (sem argumentos), calculado uma vez.
+
+        A chave é o nome qualificado: uma função redefinida a cada rerun do
+        Streamlit continua acertando o cache.
+        """
+        chave = f"{funcao.__module__}.{funcao.__qualname__}"
+        with self._trava:
+            if chave in self._calculados:
+                self.acertos += 1
+                return self._calculados[chave]
+        valor = funcao()
+        with self._trava:
+            self._calculados[chave] = valor
+            self.cargas += 1
+        return valor
+
+    def invalidar(self, caminho=None):
+        """Descarta o cache de um arquivo (ou tudo, sem caminho)"""
+        with self._trava:
+            if caminho is None:
+                self._arquivos.clear()
+                self._calculados.clear()
+            else:
+                self._arquivos.pop(os.path.abspath(caminho), None)
@@ -0,0 +1,57 @@
+import json
+import os
+from datetime import datetime
+
+class CacheVeiculos:
+    """Cache em disco dos PIDs suportados, protocolo e informações de cada veículo.
+
+    A chave é VIN + ID de calibração: uma calibração nova invalida a entrada
+    antiga do mesmo VIN.
+    """
+    def __init__(self, caminho="cache_veiculos.json"):
+        self.caminho = caminho
+        self.dados = {"veiculos": {}, "portas": {}}
+        if os.path.exists(caminho):
+            try:
+                with open(caminho, "r") as f:
+                    self.dados.update(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Cache de veículos ignorado: {e}")
+
+    @staticmethod
+    def chave(vin, cal_id):
+        return f"{vin}|{cal_id}"
+
+    def buscar(self, vin, cal_id):
+        return self.dados["veiculos"].get(self.chave(vin, cal_id))
+
+    def protocolo_da_porta(self, porta):
+        """Protocolo usado na última conexão por esta porta (dica para o ELM)"""
+        return self.dados["portas"].get(str(porta), {}).get("protocolo_id")
+
+    def salvar(self, vin, cal_id, protocolo_id, comandos, info, porta=None):
+        # Remove calibrações antigas do mesmo VIN
+        self.dados["veiculos"] = {k: v for k, v in self.dados["veiculos"].items()
+                                  if v["vin"] != vin}
+        self.dados["veiculos"][self.chave(vin, cal_id)] = {
+            "vin": vin,
+            "cal_id": cal_id,
+            "protocolo_id": protocolo_id,
+            "comandos": sorted(comandos),
+            "info": info,
+            "salvo_em": datetime.now().strftime("%Y%m%d_%H%M%S"),
+        }
+        if porta:
+            self.dados["portas"][str(porta)] = {"protocolo_id": protocolo_id}
+        self._gravar()
+
+    def invalidar(self, vin):
+        self.dados["veiculos"] = {k: v for k, v in self.dados["veiculos"].items()
+                                  if v["vin"] != vin}
+        self._gravar()
+
+    def _gravar(self):
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w") as f:
+            json.dump(self.dados, f, indent=2)
+        os.replace(temporario, self.caminho)
@@ -0,0 +1,53 @@
+import json
+import select
+import socket
+import pandas as pd
+
+PORTA_CONTROLE = 47700  # UDP em 127.0.0.1
+TAMANHO_MAXIMO = 65507  # Maior datagrama UDP
+
+class CanalControle:
+    """Lado do simulador: recebe comandos do painel por UDP local.
+
+    O socket não bloqueia, então `receber()` no ciclo custa uma chamada de
+    sistema e não toca no disco. Comandos são dicts com a chave "cmd"
+    ("pausar", "retomar", "intervalo", "mapa").
+    """
+    def __init__(self, porta=PORTA_CONTROLE):
+        self.porta = porta
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", porta))
+        self.sock.setblocking(False)
+
+    def receber(self, timeout=0.0):
+        """Comandos pendentes; com timeout, espera até chegar algum (ex.: em pausa)"""
+        if timeout:
+            select.select([self.sock], [], [], timeout)
+        comandos = []
+        while True:
+            try:
+                dados = self.sock.recv(TAMANHO_MAXIMO)
+            except BlockingIOError:
+                return comandos
+            try:
+                comando = json.loads(dados)
+            except ValueError:
+                continue
+            if isinstance(comando, dict) and "cmd" in comando:
+                comandos.append(comando)
+
+    def close(self):
+        self.sock.close()
+
+def enviar_comando(cmd, porta=PORTA_CONTROLE, **dados):
+    """Lado do painel: envia um comando ao simulador (sem resposta)"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.sendto(json.dumps({"cmd": cmd, **dados}).encode(), ("127.0.0.1", porta))
+
+def enviar_mapa(tipo, df, porta=PORTA_CONTROLE):
+    """Envia um mapa ("ve", "lambda") para recarga no simulador em execução"""
+    enviar_comando("mapa", porta, tipo=tipo, index=[str(i) for i in df.index],
+                   columns=[str(c) for c in df.columns], valores=df.values.tolist())
+
+def mapa_do_comando(comando):
+    return pd.DataFrame(comando["valores"], index=comando["index"], columns=comando["columns"])
@@ -9,6 +9,7 @@ CONFIG_MOTOR = {
         "tempo_morto": 1.0,  # ms
         "pressao": 3.0,  # bar
         "densidade_combustivel": 0.789,  # g/cm³ (gasolina)
+        "afr_estequiometrico": 14.7,  # gasolina
     },
     "lambda": {
         "min": 0.7,
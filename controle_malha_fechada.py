@@ -1,3 +1,7 @@
+import numpy as np
+
+CORRECOES = ('corr_marcha', 'corr_lambda', 'corr_knock')  # Saídas de GerenciadorControle
+
 class ControladorPID:
     def __init__(self, kp=0.1, ki=0.05, kd=0.02):
         self.kp = kp
@@ -80,3 +84,117 @@ class GerenciadorControle:
             'corr_knock': self.controle_knock.calcular_correcao(
                 dados_motor.get('knock', 0), dt)
         }
+
+def _min_escalar(a, b):
+    """min(a, b) do Python elemento a elemento (b só vence se for menor; NaN em b perde)"""
+    return np.where(b < a, b, a)
+
+def _max_escalar(a, b):
+    """max(a, b) do Python elemento a elemento"""
+    return np.where(b > a, b, a)
+
+def _selecionar(ativos, novo, antigo):
+    return novo if ativos is None else np.where(ativos, novo, antigo)
+
+class BancoPID:
+    """N controladores PID em arrays: uma chamada de calcular atualiza todos.
+
+    Mesmas operações, na mesma ordem, de ControladorPID (anti-windup do
+    integral e saturação da saída em ±1), então cada posição sai idêntica ao
+    controlador escalar. Ganhos podem ser escalares ou um array por posição;
+    `ativos` (máscara) deixa o estado das posições desligadas intacto.
+    """
+    def __init__(self, n, kp=0.1, ki=0.05, kd=0.02):
+        self.n = n
+        self.kp = np.broadcast_to(np.asarray(kp, dtype=float), (n,)).copy()
+        self.ki = np.broadcast_to(np.asarray(ki, dtype=float), (n,)).copy()
+        self.kd = np.broadcast_to(np.asarray(kd, dtype=float), (n,)).copy()
+        self.erro_anterior = np.zeros(n)
+        self.integral = np.zeros(n)
+
+    def calcular(self, erro, dt, ativos=None):
+        with np.errstate(divide="ignore", invalid="ignore"):  # dt = 0 só em posições inativas
+            integral = self.integral + erro * dt
+            integral = _max_escalar(-1.0, _min_escalar(1.0, integral))
+
+            derivada = (erro - self.erro_anterior) / dt
+        self.integral = _selecionar(ativos, integral, self.integral)
+        self.erro_anterior = _selecionar(ativos, erro, self.erro_anterior)
+
+        saida = (erro * self.kp +
+                 integral * self.ki +
+                 derivada * self.kd)
+
+        return _max_escalar(-1.0, _min_escalar(1.0, saida))
+
+class BancoControleMarcha:
+    def __init__(self, n):
+        self.pid = BancoPID(n, kp=0.2, ki=0.1, kd=0.05)
+        self.rpm_alvo = 800
+
+    def calcular_correcao(self, rpm_atual, dt, ativos=None):
+        erro = (self.rpm_alvo - rpm_atual) / 1000
+        return 1.0 + self.pid.calcular(erro, dt, ativos)
+
+class BancoControleLambda:
+    def __init__(self, n):
+        self.pid = BancoPID(n, kp=0.1, ki=0.05, kd=0.01)
+        self.correcao_atual = np.ones(n)
+
+    def calcular_correcao(self, lambda_atual, lambda_alvo, dt, ativos=None):
+        erro = (lambda_alvo - lambda_atual)
+        correcao = self.pid.calcular(erro, dt, ativos)
+        correcao = _max_escalar(0.8, _min_escalar(1.2, 1.0 + correcao))
+        self.correcao_atual = _selecionar(ativos, correcao, self.correcao_atual)
+        return correcao
+
+class BancoControleKnock:
+    def __init__(self, n):
+        self.reducao_maxima = 10  # Graus
+        self.knock_threshold = 5.0
+        self.recuperacao_rate = 0.5  # Graus por segundo
+        self.reducao_atual = np.zeros(n)
+
+    def calcular_correcao(self, knock_sensor, dt, ativos=None):
+        reducao = np.where(knock_sensor > self.knock_threshold,
+                           _min_escalar(self.reducao_maxima, self.reducao_atual + 2),
+                           _max_escalar(0, self.reducao_atual - self.recuperacao_rate * dt))
+        self.reducao_atual = _selecionar(ativos, reducao, self.reducao_atual)
+        return 0.0 - reducao  # Como o escalar: sem redução sai 0, não -0.0
+
+class GerenciadorControleBanco:
+    """GerenciadorControle para N malhas em paralelo (veículos, logs ou variantes).
+
+    `atualizar` recebe arrays (ou escalares) com as mesmas chaves de
+    GerenciadorControle.atualizar e devolve arrays de correções. O primeiro
+    passo de cada posição não tem dt e sai NaN; posições fora de `ativos` ou
+    com timestamp que não avança também saem NaN, sem mexer no estado.
+    """
+    def __init__(self, n):
+        self.n = n
+        self.controle_marcha = BancoControleMarcha(n)
+        self.controle_lambda = BancoControleLambda(n)
+        self.controle_knock = BancoControleKnock(n)
+        self.ultimo_timestamp = np.full(n, np.nan)
+
+    def atualizar(self, dados_motor, ativos=None):
+        timestamp_atual = np.broadcast_to(np.asarray(dados_motor['timestamp'], dtype=float), (self.n,))
+        primeiro = np.isnan(self.ultimo_timestamp)
+        dt = timestamp_atual - self.ultimo_timestamp
+        validos = ~primeiro & (dt > 0)
+        recebidos = ~np.isnan(timestamp_atual)
+        if ativos is not None:
+            validos &= ativos
+            recebidos &= ativos
+        self.ultimo_timestamp = np.where(recebidos & (primeiro | validos),
+                                         timestamp_atual, self.ultimo_timestamp)
+
+        knock = dados_motor.get('knock', 0)
+        correcoes = {
+            'corr_marcha': self.controle_marcha.calcular_correcao(
+                dados_motor['rpm'], dt, validos),
+            'corr_lambda': self.controle_lambda.calcular_correcao(
+                dados_motor['lambda'], dados_motor['lambda_alvo'], dt, validos),
+            'corr_knock': self.controle_knock.calcular_correcao(knock, dt, validos),
+        }
+        return {nome: np.where(validos, valor, np.nan) for nome, valor in correcoes.items()}
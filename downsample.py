@@ -0,0 +1,70 @@
+import numpy as np
+
+def minmax(x, y, pontos):
+    """Mantém mínimo e máximo de cada bucket (preserva picos)"""
+    n = len(y)
+    if n <= pontos:
+        return x, y
+
+    tamanho = int(np.ceil(n / max(1, pontos // 2)))
+    buckets = int(np.ceil(n / tamanho))
+    y = np.asarray(y, dtype=float)
+    pad = buckets * tamanho - n
+
+    # NaN nunca vence a comparação de mínimo/máximo
+    y_min = np.pad(np.where(np.isnan(y), np.inf, y), (0, pad), constant_values=np.inf)
+    y_max = np.pad(np.where(np.isnan(y), -np.inf, y), (0, pad), constant_values=-np.inf)
+    base = np.arange(buckets) * tamanho
+    i_min = base + y_min.reshape(buckets, tamanho).argmin(axis=1)
+    i_max = base + y_max.reshape(buckets, tamanho).argmax(axis=1)
+
+    indices = np.unique(np.concatenate(([0, n - 1], i_min, i_max)))
+    indices = indices[indices < n]
+    return np.asarray(x)[indices], y[indices]
+
+def lttb(x, y, pontos):
+    """Largest-Triangle-Three-Buckets: preserva a forma visual da série"""
+    n = len(y)
+    if n <= pontos or pontos < 3:
+        return x, y
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    limites = np.linspace(1, n - 1, pontos - 1).astype(int)
+    indices = np.empty(pontos, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    a = 0
+    for i in range(pontos - 2):
+        ini, fim = limites[i], limites[i + 1]
+        # Média do próximo bucket é o terceiro vértice do triângulo
+        prox_ini = fim
+        prox_fim = limites[i + 2] if i + 2 < len(limites) else n
+        mx = x[prox_ini:prox_fim].mean()
+        my = y[prox_ini:prox_fim].mean()
+
+        areas = np.abs((x[a] - mx) * (y[ini:fim] - y[a]) -
+                       (x[a] - x[ini:fim]) * (my - y[a]))
+        a = ini + int(np.nanargmax(areas)) if not np.all(np.isnan(areas)) else ini
+        indices[i + 1] = a
+
+    return x[indices], y[indices]
+
+METODOS = {
+    "minmax": minmax,
+    "lttb": lttb,
+}
+
+def reduzir_serie(x, y, pontos=1000, metodo="minmax"):
+    """Reduz uma série ao orçamento de pontos do gráfico"""
+    return METODOS[metodo](x, y, pontos)
+
+def janela_zoom(df, inicio=None, fim=None, coluna="tempo"):
+    """Recorte do DataFrame no intervalo [inicio, fim] da coluna de tempo"""
+    if df.empty or (inicio is None and fim is None):
+        return df
+    valores = df[coluna].to_numpy()
+    i = 0 if inicio is None else np.searchsorted(valores, inicio, side="left")
+    j = len(valores) if fim is None else np.searchsorted(valores, fim, side="right")
+    return df.iloc[i:j]
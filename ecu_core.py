@@ -1,15 +1,48 @@
+import numpy as np
 from sensores import SensorManager
 from controle_malha_fechada import GerenciadorControle
+from mapas_base import Mapa2D, criar_mapa_ve_base, criar_mapa_lambda_base
+
+R_AR = 287.05  # J/(kg·K)
 
 class ECU:
-    def __init__(self, config):
+    def __init__(self, config, seed=None, mapa_ve=None, mapa_lambda=None):
         self.config = config
-        self.sensors = SensorManager()
+        self.sensors = SensorManager(seed)
         self.controle = GerenciadorControle()
+        self.carregar_mapas(mapa_ve, mapa_lambda)
+        self._calcular_constantes_injecao()
+
+    def carregar_mapas(self, mapa_ve=None, mapa_lambda=None):
+        """Carrega mapas VE/lambda (DataFrames no formato de mapas_base)"""
+        if mapa_ve is not None or not hasattr(self, 'mapa_ve'):
+            self.mapa_ve = Mapa2D.from_dataframe(
+                mapa_ve if mapa_ve is not None else criar_mapa_ve_base())
+        if mapa_lambda is not None or not hasattr(self, 'mapa_lambda'):
+            self.mapa_lambda = Mapa2D.from_dataframe(
+                mapa_lambda if mapa_lambda is not None else criar_mapa_lambda_base())
+
+    def _calcular_constantes_injecao(self):
+        """Constantes do speed-density derivadas do config (calculadas uma vez)"""
+        injetor = self.config["injetor"]
+        vazao_g_ms = injetor["vazao"] * injetor["densidade_combustivel"] / 60000  # cc/min -> g/ms
+        afr = injetor.get("afr_estequiometrico", 14.7)
+
+        # Massa de ar por cilindro (g) = VE/100 * MAP*1000 * Vcil / (R * T) * 1000
+        # Pulso (ms) = massa_ar / (AFR * lambda) / vazão + tempo morto
+        self.k_injecao = self.config["cilindrada_unitaria"] * 1e4 / (R_AR * afr * vazao_g_ms)
+        self.tempo_morto = injetor["tempo_morto"]
         
     def cycle(self, t_corrente):
         # Lê todos os sensores
-        sensor_data = self.sensors.read_all(t_corrente)
+        leitura = self.sensors.read_all(t_corrente)
+        rpm, tps = leitura['rpm'], leitura['tps']
+        sensor_data = {
+            **leitura,
+            'timestamp': t_corrente,
+            've': self.mapa_ve.valor(rpm, tps),
+            'lambda_alvo': self.mapa_lambda.valor(rpm, tps),
+        }
         
         # Aplica controles em malha fechada
         correcoes = self.controle.atualizar(sensor_data)
@@ -23,6 +56,58 @@ class ECU:
             **correcoes
         }
         
+    def cycle_batch(self, tempos):
+        """Executa cycle para um vetor de tempos de uma vez (modo lote).
+
+        Sensores são simulados vetorizados; os controles PID dependem do passo
+        anterior e rodam em sequência sobre os arrays. Correções do primeiro
+        passo (sem dt) ficam NaN.
+        """
+        tempos = np.asarray(tempos, dtype=float)
+        n = len(tempos)
+        dados = self.sensors.read_all_batch(tempos)
+        dados['timestamp'] = tempos
+        dados['ve'] = self.mapa_ve.valores(dados['rpm'], dados['tps'])
+        dados['lambda_alvo'] = self.mapa_lambda.valores(dados['rpm'], dados['tps'])
+
+        correcoes = {'corr_marcha': np.full(n, np.nan),
+                     'corr_lambda': np.full(n, np.nan),
+                     'corr_knock': np.full(n, np.nan)}
+        colunas = list(dados)
+        for i, linha in enumerate(zip(*(dados[c].tolist() for c in colunas))):
+            for nome, valor in self.controle.atualizar(dict(zip(colunas, linha))).items():
+                correcoes[nome][i] = valor
+
+        dados['inj_ms'] = self.calcular_injecao_batch(dados)
+        return {**dados, **correcoes}
+        
     def calcular_injecao(self, sensors):
-        # Cálculo básico do tempo de injeção
-        return 5.0  # Valor base para teste
+        """Tempo de injeção (ms) por speed-density: MAP, IAT, VE e lambda alvo"""
+        ve = sensors.get('ve') or self.mapa_ve.valor(sensors['rpm'], sensors['tps'])
+        lambda_alvo = (sensors.get('lambda_alvo') or
+                       self.mapa_lambda.valor(sensors['rpm'], sensors['tps']))
+        t_ar = sensors['iat'] + 273.15
+        return self.k_injecao * ve * sensors['map_kpa'] / (t_ar * lambda_alvo) + self.tempo_morto
+
+    def calcular_injecao_batch(self, dados, usar_mapas=False):
+        """Versão vetorizada de calcular_injecao para arrays de amostras (ex.: logs).
+
+        VE e lambda alvo ausentes ou zerados vêm dos mapas; com usar_mapas=True
+        vêm sempre dos mapas atuais, ignorando as colunas do log.
+        """
+        rpm = np.asarray(dados['rpm'], dtype=float)
+        tps = np.asarray(dados['tps'], dtype=float)
+        ve = self._coluna_ou_mapa(dados, 've', self.mapa_ve, rpm, tps, usar_mapas)
+        lambda_alvo = self._coluna_ou_mapa(dados, 'lambda_alvo', self.mapa_lambda, rpm, tps, usar_mapas)
+        t_ar = np.asarray(dados['iat'], dtype=float) + 273.15
+        map_kpa = np.asarray(dados['map_kpa'], dtype=float)
+        return self.k_injecao * ve * map_kpa / (t_ar * lambda_alvo) + self.tempo_morto
+
+    @staticmethod
+    def _coluna_ou_mapa(dados, coluna, mapa, rpm, tps, usar_mapas):
+        if usar_mapas or coluna not in dados:
+            return mapa.valores(rpm, tps)
+        valores = np.asarray(dados[coluna], dtype=float)
+        if np.all(valores > 0):
+            return valores
+        return np.where(valores > 0, valores, mapa.valores(rpm, tps))
@@ -1,49 +1,316 @@
 import pandas as pd
 import numpy as np
-import json
-import os
-from datetime import datetime
+import time
+from collections import deque
+import obd
+from backup_mapas import ArmazemBackups
+
+# Layout dos mapas na memória da ECU (exemplo: cada ECU tem o seu)
+RPM_BINS = [1000, 2000, 3000, 4000, 5000, 6000, 7000]
+TPS_BINS = [0, 10, 25, 50, 75, 100]
+TAMANHO_MAPA = len(RPM_BINS) * len(TPS_BINS)  # 1 byte por célula, no início da região
+TAMANHO_REGIAO = 0x1000  # Região inteira, lida só para backups
+REGIOES_MAPA = {
+    "fuel": 0x1000,
+    "combustível": 0x1000,
+    "ignição": 0x2000,
+    "boost": 0x3000,
+}
+
+# Tamanhos de bloco testados no ReadMemoryByAddress (0x23), do maior ao menor
+BLOCOS_LEITURA = [0x800, 0x400, 0x200, 0x100, 0x80, 0x40, 0x20]
+BLOCO_DID = 0x10  # Leitura por ReadDataByIdentifier (0x22), 16 bytes por endereço
+
+# Escrita por WriteMemoryByAddress (0x3D): bloco inicial e junção de faixas
+# separadas por poucos bytes iguais (reenviar é mais barato que outra transação)
+BLOCO_ESCRITA = 0x80
+INTERVALO_JUNCAO = 4
+NRC_SERVICO_NAO_SUPORTADO = 0x11
 
 class ECUMapper:
-    def __init__(self, obd_connection):
+    def __init__(self, obd_connection, tentativas=3, vin=None, backup_dir="mapas_backup"):
         self.connection = obd_connection
-        self.backup_dir = "mapas_backup"
-        os.makedirs(self.backup_dir, exist_ok=True)
-        
+        self.backup_dir = backup_dir
+        self.backups = ArmazemBackups(self.backup_dir)
+        if isinstance(vin, (bytes, bytearray)):
+            vin = vin.decode(errors="ignore").strip()  # VIN cru do python-OBD
+        self.vin = vin or None
+        self.tentativas = tentativas
+        self.modo_leitura = None  # "0x23" ou "0x22", descoberto na primeira leitura
+        self.bloco_leitura = None
+        self.celulas = {}  # map_type -> últimas células lidas/gravadas na ECU
+        self.imagens = {}  # map_type -> última imagem da região inteira
+        self.ultima_leitura = None
+        self.modo_escrita = "0x3D"
+        self.bloco_escrita = BLOCO_ESCRITA
+        self.ultimo_nrc = None
+        self._parciais = {}  # (inicio, tamanho) -> (imagem, lidos) para retomar
+
     def read_current_map(self, map_type):
-        """Lê mapa atual da ECU"""
-        if map_type == "fuel":
-            # Exemplo de leitura de mapa de combustível
-            # Cada ECU tem seus próprios comandos
-            values = []
-            for addr in range(0x1000, 0x1FFF, 0x10):
-                response = self.connection.query(f"22 {addr:04X}")
-                if response.is_null():
-                    continue
-                values.extend(response.value)
-            return self.convert_to_dataframe(values)
-            
-    def write_map(self, map_type, df_map):
-        """Escreve mapa na ECU"""
-        # Faz backup antes de escrever
-        self.backup_map(map_type)
+        """Lê mapa atual da ECU (só os bytes das células)"""
+        celulas = self.ler_memoria(self._endereco(map_type), TAMANHO_MAPA)
+        self._guardar_imagem(map_type, celulas)
+        return self.convert_to_dataframe(celulas)
+
+    def ler_regiao(self, map_type):
+        """Lê a região inteira do mapa (para backup)"""
+        imagem = self.ler_memoria(self._endereco(map_type), TAMANHO_REGIAO)
+        self._guardar_imagem(map_type, imagem)
+        return imagem
+
+    def _guardar_imagem(self, map_type, dados):
+        """Atualiza células e imagem da região com bytes lidos a partir do início"""
+        self.celulas[map_type] = bytes(dados[:TAMANHO_MAPA])
+        if len(dados) >= TAMANHO_REGIAO:
+            self.imagens[map_type] = bytes(dados)
+        elif map_type in self.imagens:
+            imagem = bytearray(self.imagens[map_type])
+            imagem[:len(dados)] = dados
+            self.imagens[map_type] = bytes(imagem)
+
+    def convert_to_dataframe(self, values):
+        """Converte a imagem (1 byte por célula, linhas = RPM) em DataFrame"""
+        n = len(RPM_BINS) * len(TPS_BINS)
+        celulas = np.frombuffer(bytes(values[:n]), dtype=np.uint8).astype(int)
+        return pd.DataFrame(
+            celulas.reshape(len(RPM_BINS), len(TPS_BINS)),
+            index=[f"{rpm} RPM" for rpm in RPM_BINS],
+            columns=[f"{tps}%" for tps in TPS_BINS]
+        )
+
+    def ler_memoria(self, inicio, tamanho):
+        """Lê uma faixa de memória em blocos grandes, refazendo os que falharem.
+
+        Blocos que falharem em todas as tentativas ficam pendentes: a exceção
+        informa as faixas e uma nova chamada retoma só o que faltou.
+        """
+        chave = (inicio, tamanho)
+        imagem, lidos = self._parciais.get(chave, (bytearray(tamanho), bytearray(tamanho)))
+        t0 = time.time()
+        ja_lidos = sum(lidos)
+        requisicoes = 0
+        if self.modo_leitura is None:
+            # A leitura de teste que deu certo já é o começo da faixa
+            dados, requisicoes = self._descobrir_modo_leitura(inicio)
+            if dados:
+                n = min(len(dados), tamanho)
+                imagem[:n] = dados[:n]
+                lidos[:n] = b"\x01" * n
+
+        pendentes = deque(self._faixas_pendentes(inicio, lidos))
+        falhas = {}
+        while pendentes:
+            endereco, n = pendentes.popleft()
+            dados = self._ler_bloco(endereco, n)
+            requisicoes += 1
+            if dados is None:
+                falhas[endereco] = falhas.get(endereco, 0) + 1
+                if falhas[endereco] < self.tentativas:
+                    # Volta para o fim da fila: falhas transitórias costumam passar
+                    pendentes.append((endereco, n))
+                continue
+            offset = endereco - inicio
+            imagem[offset:offset + n] = dados
+            lidos[offset:offset + n] = b"\x01" * n
+
+        duracao = time.time() - t0
+        total = sum(lidos) - ja_lidos
+        self.ultima_leitura = {
+            "bytes": total,
+            "segundos": duracao,
+            "bytes_s": total / duracao if duracao > 0 else float("inf"),
+            "requisicoes": requisicoes,
+            "bloco": self.bloco_leitura,
+            "modo": self.modo_leitura,
+        }
+        print(f"Leitura 0x{inicio:04X}: {total} bytes em {duracao:.2f}s "
+              f"({self.ultima_leitura['bytes_s']:.0f} B/s, {requisicoes} requisições)")
+
+        faltando = self._faixas_pendentes(inicio, lidos)
+        if faltando:
+            self._parciais[chave] = (imagem, lidos)
+            faixas = ", ".join(f"0x{e:04X}+{n}" for e, n in faltando)
+            raise IOError(f"Falha lendo {faixas}; leia novamente para retomar")
+        self._parciais.pop(chave, None)
+        return bytes(imagem)
+
+    def _faixas_pendentes(self, inicio, lidos):
+        """Faixas ainda não lidas, quebradas no tamanho de bloco atual"""
+        faixas = []
+        i = 0
+        while i < len(lidos):
+            if lidos[i]:
+                i += 1
+                continue
+            n = 1
+            while i + n < len(lidos) and not lidos[i + n] and n < self.bloco_leitura:
+                n += 1
+            faixas.append((inicio + i, n))
+            i += n
+        return faixas
+
+    def _descobrir_modo_leitura(self, endereco):
+        """Maior bloco aceito pelo ReadMemoryByAddress; senão, leitura por DID.
+
+        Retorna (dados lidos a partir de `endereco` ou None, requisições feitas).
+        Só a falta de resposta é repetida: uma recusa (NRC) passa ao próximo
+        tamanho, e "serviço não suportado" vai direto para o DID.
+        """
+        requisicoes = 0
+        for tamanho in BLOCOS_LEITURA:
+            for _ in range(self.tentativas):
+                dados = self._enviar(f"2322{endereco:04X}{tamanho:04X}", 0x63, tamanho)
+                requisicoes += 1
+                if dados is not None:
+                    self.modo_leitura, self.bloco_leitura = "0x23", tamanho
+                    return dados, requisicoes
+                if self.ultimo_nrc is not None:
+                    break
+            if self.ultimo_nrc == NRC_SERVICO_NAO_SUPORTADO:
+                break
+        self.modo_leitura, self.bloco_leitura = "0x22", BLOCO_DID
+        return self._ler_bloco(endereco, BLOCO_DID), requisicoes + 1
+
+    def _ler_bloco(self, endereco, n):
+        if self.modo_leitura == "0x23":
+            return self._enviar(f"2322{endereco:04X}{n:04X}", 0x63, n)
+
+        # ReadDataByIdentifier: o endereço é o DID e a resposta tem 16 bytes;
+        # uma faixa que cruza a fronteira junta os DIDs que a cobrem
+        base = endereco - endereco % BLOCO_DID
+        blocos = []
+        for did in range(base, endereco + n, BLOCO_DID):
+            dados = self._enviar(f"22{did:04X}", 0x62, BLOCO_DID, cabecalho=3)
+            if dados is None:
+                return None
+            blocos.append(dados)
+        return b"".join(blocos)[endereco - base:endereco - base + n]
+
+    def _requisicoes_leitura(self, endereco, n):
+        """Requisições que `_ler_bloco` faz para a faixa (por DID, uma a cada 16 bytes cobertos)"""
+        if self.modo_leitura == "0x23":
+            return 1
+        return (endereco + n - 1) // BLOCO_DID - endereco // BLOCO_DID + 1
+
+    def _enviar(self, requisicao, resposta_positiva, tamanho=None, cabecalho=1):
+        """Envia um serviço de diagnóstico e retorna os dados da resposta positiva"""
+        cmd = obd.OBDCommand("SERVICO", requisicao, requisicao.encode(), 0,
+                             lambda messages: messages, fast=False)
+        self.ultimo_nrc = None
+        response = self.connection.query(cmd, force=True)
+        if response.is_null():
+            return None
+        for msg in response.value:
+            if len(msg.data) >= 3 and msg.data[0] == 0x7F:
+                self.ultimo_nrc = msg.data[2]
+            if msg.data and msg.data[0] == resposta_positiva:
+                dados = bytes(msg.data[cabecalho:])
+                if tamanho is None or len(dados) >= tamanho:
+                    return dados[:tamanho]
+        return None
+
+    def _endereco(self, map_type):
+        if map_type not in REGIOES_MAPA:
+            raise ValueError(f"Tipo de mapa desconhecido: {map_type}")
+        return REGIOES_MAPA[map_type]
+
+    def write_map(self, map_type, df_map, verificar=True):
+        """Escreve na ECU só as faixas alteradas, em blocos, verificando cada uma.
+
+        Retorna um relatório com os blocos gravados, transações, erros e o
+        modo e tamanho de bloco em uso ao final (reduções valem só nesta gravação).
+        """
+        if df_map.shape != (len(RPM_BINS), len(TPS_BINS)):
+            raise ValueError(f"Mapa com formato {df_map.shape}, esperado "
+                             f"{(len(RPM_BINS), len(TPS_BINS))}")
+        if map_type not in self.celulas:
+            self.read_current_map(map_type)
+        celulas = np.clip(np.rint(df_map.values.astype(float)), 0, 255).astype(np.uint8)
+        return self._gravar_imagem(map_type, self.celulas[map_type], celulas.tobytes(), verificar)
+
+    def restaurar_backup(self, id_backup, verificar=True):
+        """Grava de volta a imagem de um backup (só o que difere da ECU)"""
+        entrada = self.backups.entradas[id_backup]
+        imagem = self.backups.carregar(id_backup)
+        if entrada["tipo"] not in self.imagens:
+            self.ler_regiao(entrada["tipo"])
+        return self._gravar_imagem(entrada["tipo"], self.imagens[entrada["tipo"]], imagem, verificar)
+
+    def _gravar_imagem(self, map_type, atual, nova, verificar):
+        """Grava os bytes de `nova` que diferem de `atual` (ambos desde o início da região)"""
+        inicio = self._endereco(map_type)
         
-        values = df_map.values.flatten()
-        for i, value in enumerate(values):
-            addr = 0x1000 + i
-            cmd = f"2E {addr:04X} {int(value):02X}"
-            self.connection.query(cmd)
+        # Faz backup antes de escrever (da região já conhecida; senão, lê a região uma vez)
+        self.backup_map(map_type, imagem=self.imagens.get(map_type))
+        
+        t0 = time.time()
+        # Blocos reduzidos por falhas valem só para esta gravação
+        bloco = 1 if self.modo_escrita == "0x2E" else self.bloco_escrita
+        gravada = bytearray(atual)
+        relatorio = {"blocos": [], "erros": [], "transacoes": 0,
+                     "bytes_alterados": sum(a != b for a, b in zip(atual, nova))}
+        pendentes = deque(self._faixas_alteradas(atual, nova))
+        falhas = {}
+        while pendentes:
+            offset, n = pendentes.popleft()
+            if n > bloco:
+                pendentes.appendleft((offset + bloco, n - bloco))
+                n = bloco
+            endereco = inicio + offset
+            dados = bytes(nova[offset:offset + n])
+            
+            ok = self._escrever_bloco(endereco, dados)
+            relatorio["transacoes"] += 1
+            if ok and verificar:
+                ok = self._ler_bloco(endereco, n) == dados
+                relatorio["transacoes"] += self._requisicoes_leitura(endereco, n)
             
-    def backup_map(self, map_type):
-        """Faz backup do mapa atual"""
-        current_map = self.read_current_map(map_type)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{self.backup_dir}/{map_type}_{timestamp}.json"
+            if ok:
+                gravada[offset:offset + n] = dados
+                relatorio["blocos"].append({"endereco": endereco, "tamanho": n,
+                                            "verificado": verificar,
+                                            "tentativas": falhas.pop(endereco, 0) + 1})
+            elif self.modo_escrita == "0x3D" and self.ultimo_nrc == NRC_SERVICO_NAO_SUPORTADO:
+                # Sem WriteMemoryByAddress: grava byte a byte por DID (0x2E)
+                self.modo_escrita, bloco = "0x2E", 1
+                pendentes.appendleft((offset, n))
+            else:
+                falhas[endereco] = falhas.get(endereco, 0) + 1
+                if falhas[endereco] < self.tentativas:
+                    pendentes.append((offset, n))
+                elif n > 1:
+                    # Falhou sempre com este tamanho: tenta blocos menores
+                    bloco = max(1, n // 2)
+                    falhas.pop(endereco)
+                    pendentes.appendleft((offset, n))
+                else:
+                    relatorio["erros"].append(endereco)
         
-        with open(filename, "w") as f:
-            json.dump({
-                "type": map_type,
-                "timestamp": timestamp,
-                "data": current_map.to_dict()
-            }, f)
-        return filename
+        self._guardar_imagem(map_type, gravada)
+        relatorio.update(modo=self.modo_escrita, bloco=bloco, segundos=time.time() - t0)
+        return relatorio
+    
+    def _faixas_alteradas(self, atual, nova):
+        """Faixas (offset, tamanho) com bytes diferentes, juntando intervalos curtos"""
+        diferentes = np.flatnonzero(np.frombuffer(atual, dtype=np.uint8) !=
+                                    np.frombuffer(bytes(nova), dtype=np.uint8))
+        faixas = []
+        for i in diferentes.tolist():
+            if faixas and i - (faixas[-1][0] + faixas[-1][1]) <= INTERVALO_JUNCAO:
+                faixas[-1][1] = i - faixas[-1][0] + 1
+            else:
+                faixas.append([i, 1])
+        return [tuple(f) for f in faixas]
+    
+    def _escrever_bloco(self, endereco, dados):
+        if self.modo_escrita == "0x3D":
+            requisicao = f"3D22{endereco:04X}{len(dados):04X}{dados.hex().upper()}"
+            return self._enviar(requisicao, 0x7D) is not None
+        return all(self._enviar(f"2E{endereco + i:04X}{b:02X}", 0x6E) is not None
+                   for i, b in enumerate(dados))
+            
+    def backup_map(self, map_type, imagem=None):
+        """Faz backup do mapa atual; retorna a entrada do índice"""
+        if imagem is None:
+            imagem = self.ler_regiao(map_type)
+        return self.backups.salvar(map_type, imagem, vin=self.vin)
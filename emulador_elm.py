@@ -0,0 +1,360 @@
+import os
+import select
+import threading
+import time
+import tty
+from config_motor import CONFIG_MOTOR
+from ecu_mapper import REGIOES_MAPA, RPM_BINS, TPS_BINS
+from mapas_base import Mapa2D, criar_mapa_ve_base, criar_mapa_ignicao_base
+from protocolos import PROTOCOLOS
+from sensores import SensorManager
+
+# Número do protocolo no ELM327 (ATDPN) para cada ProtocoloConfig
+ID_ELM = {"CAN_11_500": "6", "ISO9141": "3", "KWP2000": "5"}
+BAUD_SERIAL = 38400  # Padrão do ELM327
+BITS_POR_QUADRO_CAN = 130  # 8 bytes de dados + cabeçalho, CRC e bit stuffing
+
+VIN_PADRAO = "9BWSE4LA7TV836549"
+CAL_ID_PADRAO = "EMULADOR-CAL-A7"
+NOME_ECU_PADRAO = "ECU-EMULADA"
+
+def _u8(valor):
+    return [int(round(min(255, max(0, valor))))]
+
+def _u16(valor):
+    v = int(round(min(65535, max(0, valor))))
+    return [v >> 8, v & 0xFF]
+
+def criar_imagem_padrao():
+    """Memória da ECU com os mapas base nas regiões do ECUMapper (1 byte por célula)"""
+    imagem = bytearray(0x10000)
+    for tipo, criar in (("fuel", criar_mapa_ve_base), ("ignição", criar_mapa_ignicao_base)):
+        mapa = Mapa2D.from_dataframe(criar())
+        celulas = [_u8(mapa.valor(rpm, tps))[0] for rpm in RPM_BINS for tps in TPS_BINS]
+        inicio = REGIOES_MAPA[tipo]
+        imagem[inicio:inicio + len(celulas)] = bytes(celulas)
+    return imagem
+
+class EmuladorELM327:
+    """Adaptador ELM327 + ECU emulados num pseudo-terminal.
+
+    `obd.OBD(emulador.porta)` conecta como num adaptador real. Os PIDs Mode 01
+    vêm do SensorManager (avançado em passos fixos de tempo real), os serviços
+    22/2E/23/3D acessam uma imagem de memória e cada resposta espera a
+    latência da ECU mais o tempo de barramento (baudrate do ProtocoloConfig)
+    e da serial do adaptador.
+    """
+    def __init__(self, protocolo="CAN_11_500", seed=0, latencia=None,
+                 baud_serial=BAUD_SERIAL, imagem=None, max_bloco_leitura=0x800,
+                 passo=0.5, vin=VIN_PADRAO, cal_id=CAL_ID_PADRAO):
+        self.config = PROTOCOLOS[protocolo]
+        if self.config is None or protocolo not in ID_ELM:
+            raise ValueError(f"Protocolo não emulado: {protocolo}")
+        self.id_elm = ID_ELM[protocolo]
+        self.can = self.config.nome.startswith("CAN")
+        self.latencia = self.config.timeout / 10 if latencia is None else latencia
+        self.baud_serial = baud_serial
+        self.memoria = bytearray(imagem if imagem is not None else criar_imagem_padrao())
+        self.max_bloco_leitura = max_bloco_leitura
+        self.passo = passo
+        self.vin = vin
+        self.cal_id = cal_id
+        self.sensores = SensorManager(seed)
+        self.mapa_ignicao = Mapa2D.from_dataframe(criar_mapa_ignicao_base())
+        self.requisicoes = 0
+        self._resetar()
+
+        self._mestre, self._escravo = os.openpty()
+        tty.setraw(self._escravo)
+        self.porta = os.ttyname(self._escravo)
+        self._parar = threading.Event()
+        self._thread = None
+
+    def _resetar(self):
+        self.eco = True
+        self.cabecalhos = False
+        self.espacos = True
+        self.quebra_linha = False
+        self.protocolo_pedido = "0"  # Automático
+        self.conectado = False
+        self.ultimo_comando = ""
+        self._t0 = time.monotonic()
+        self._t_sim = 0.0
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._executar, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+        if self._thread:
+            self._thread.join()
+        os.close(self._mestre)
+        os.close(self._escravo)
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    def _executar(self):
+        buffer = b""
+        while not self._parar.is_set():
+            prontos, _, _ = select.select([self._mestre], [], [], 0.1)
+            if not prontos:
+                continue
+            try:
+                buffer += os.read(self._mestre, 1024)
+            except OSError:
+                break
+            while b"\r" in buffer:
+                linha, buffer = buffer.split(b"\r", 1)
+                comando = "".join(c for c in linha.decode("ascii", "ignore") if c.isprintable())
+                self._enviar(self._responder(comando.strip()))
+
+    def _enviar(self, texto):
+        dados = texto.encode()
+        while dados:
+            dados = dados[os.write(self._mestre, dados):]
+
+    def _responder(self, comando):
+        eco = comando + "\r" if self.eco else ""
+        if not comando:
+            comando = self.ultimo_comando  # CR sozinho repete o último comando
+        self.ultimo_comando = comando
+        compacto = comando.replace(" ", "").upper()
+
+        if compacto.startswith("AT"):
+            linhas = self._comando_at(compacto[2:])
+        else:
+            linhas = self._comando_obd(compacto, len(comando))
+        fim = "\r\n" if self.quebra_linha else "\r"
+        return eco + "".join(l + fim for l in linhas) + fim + ">"
+
+    def _comando_at(self, at):
+        if at in ("Z", "WS", "D"):
+            self._resetar()
+            return ["", "ELM327 v1.5"]
+        if at == "I":
+            return ["ELM327 v1.5"]
+        if at[:1] in "ELHS" and at[1:] in ("0", "1"):
+            valor = at[1:] == "1"
+            if at[0] == "E":
+                self.eco = valor
+            elif at[0] == "L":
+                self.quebra_linha = valor
+            elif at[0] == "H":
+                self.cabecalhos = valor
+            else:
+                self.espacos = valor
+            return ["OK"]
+        if at.startswith(("SP", "TP")):
+            self.protocolo_pedido = at[2:].lstrip("A") or "0"
+            self.conectado = False
+            return ["OK"]
+        if at == "DPN":
+            return [("A" if self.protocolo_pedido == "0" else "") + self.id_elm]
+        if at == "DP":
+            return [self.config.nome]
+        if at == "RV":
+            return [f"{self.sensores.sensors['bat']:.1f}V"]
+        return ["OK"]
+
+    def _comando_obd(self, hexa, caracteres):
+        if len(hexa) % 2:
+            hexa = hexa[:-1]  # Número de respostas esperadas (modo rápido do python-OBD)
+        try:
+            pedido = bytes.fromhex(hexa)
+        except ValueError:
+            return ["?"]
+        if not pedido:
+            return ["?"]
+        if self.protocolo_pedido not in ("0", self.id_elm):
+            time.sleep(self.config.timeout)
+            return ["UNABLE TO CONNECT"]
+
+        linhas = [] if self.conectado or self.protocolo_pedido != "0" else ["SEARCHING..."]
+        self.conectado = True
+        self.requisicoes += 1
+        resposta = self._servico(pedido)
+        quadros = self._quadros(resposta) if resposta else []
+        self._atrasar(pedido, quadros, caracteres)
+        if not quadros:
+            return linhas + ["NO DATA"]
+        return linhas + [self._formatar(q) for q in quadros]
+
+    # --- ECU ---
+
+    def _servico(self, pedido):
+        sid = pedido[0]
+        if sid == 0x01:
+            return self._modo_01(pedido[1:])
+        if sid == 0x03:
+            return [0x43, 0x00]  # Sem DTC
+        if sid == 0x09 and len(pedido) == 2:
+            dados = self._modo_09(pedido[1])
+            return None if dados is None else [0x49, pedido[1]] + dados
+        return self._servico_memoria(sid, pedido[1:])
+
+    def _atualizar_sensores(self):
+        agora = time.monotonic() - self._t0
+        while self._t_sim + self.passo <= agora:
+            self._t_sim += self.passo
+            self.sensores.read_all(self._t_sim)
+        return self.sensores.sensors
+
+    def _pids_modo_01(self):
+        s = self._atualizar_sensores()
+        rpm, tps, map_kpa, t_ar = s['rpm'], s['tps'], s['map_kpa'], s['iat'] + 273.15
+        # MAF (g/s) estimado por speed-density com VE fixo de 85%
+        maf = 0.85 * map_kpa * 1000 * CONFIG_MOTOR["cilindrada"] / 1000 * rpm / 120 / (287.05 * t_ar) * 1000
+        o2 = 0.8 if s['lambda'] < 1 else 0.1
+        return {
+            0x01: [0x00, 0x07, 0xE5, 0x00],  # MIL apagada, nenhum DTC
+            0x04: _u8(tps * 2.55),
+            0x05: _u8(s['ect'] + 40),
+            0x0A: _u8(300 / 3),
+            0x0B: _u8(map_kpa),
+            0x0C: _u16(rpm * 4),
+            0x0D: _u8(rpm / 7000 * 180),
+            0x0E: _u8((self.mapa_ignicao.valor(rpm, tps) + 64) * 2),
+            0x0F: _u8(s['iat'] + 40),
+            0x10: _u16(maf * 100),
+            0x11: _u8(tps * 2.55),
+            0x14: _u8(o2 / 0.005) + [0x80],
+            0x15: _u8(0.6 / 0.005) + [0xFF],
+            0x24: _u16(s['lambda'] * 32768) + _u16(o2 * 8192),
+            0x2C: _u8(0),
+            0x2F: _u8(60 * 2.55),
+            0x3C: _u16((450 + s['ect'] + 40) * 10),
+            0x42: _u16(s['bat'] * 1000),
+            0x51: [0x01],  # Gasolina
+            0x5E: _u16(maf / 14.7 / 0.745 * 3.6 * 20),
+        }
+
+    def _modo_01(self, pids):
+        if not pids:
+            return None
+        valores = self._pids_modo_01()
+        resposta = [0x41]
+        for pid in pids[:6]:
+            if pid % 0x20 == 0:
+                dados = self._mascara(pid, valores)
+            else:
+                dados = valores.get(pid)
+            if dados is not None:
+                resposta += [pid] + dados
+        return resposta if len(resposta) > 1 else None
+
+    def _modo_09(self, pid):
+        valores = {
+            0x02: [0x01] + list(self.vin.encode()),
+            0x04: [0x01] + list(self.cal_id.encode().ljust(16, b"\0")),
+            0x0A: [0x01] + list(NOME_ECU_PADRAO.encode().ljust(20, b"\0")),
+        }
+        if pid == 0x00:
+            return self._mascara(0x00, valores)
+        return valores.get(pid)
+
+    @staticmethod
+    def _mascara(base, suportados):
+        """Bitmap dos PIDs base+1..base+32 (o último bit indica a próxima faixa)"""
+        bits = 0
+        for pid in suportados:
+            if base < pid <= base + 32:
+                bits |= 1 << (32 - (pid - base))
+        if any(pid > base + 32 for pid in suportados):
+            bits |= 1
+        return [(bits >> s) & 0xFF for s in (24, 16, 8, 0)] if bits else None
+
+    def _servico_memoria(self, sid, dados):
+        negativa = [0x7F, sid]
+        try:
+            if sid == 0x22 and len(dados) == 2:
+                endereco = dados[0] << 8 | dados[1]
+                return [0x62, dados[0], dados[1]] + list(self.memoria[endereco:endereco + 16])
+            if sid == 0x2E and len(dados) > 2:
+                endereco = dados[0] << 8 | dados[1]
+                self.memoria[endereco:endereco + len(dados) - 2] = dados[2:]
+                return [0x6E, dados[0], dados[1]]
+            if sid in (0x23, 0x3D):
+                n_tam, n_end = dados[0] >> 4, dados[0] & 0x0F
+                endereco = int.from_bytes(dados[1:1 + n_end], "big")
+                tamanho = int.from_bytes(dados[1 + n_end:1 + n_end + n_tam], "big")
+                if sid == 0x23:
+                    if tamanho > self.max_bloco_leitura or endereco + tamanho > len(self.memoria):
+                        return negativa + [0x31]
+                    return [0x63] + list(self.memoria[endereco:endereco + tamanho])
+                conteudo = dados[1 + n_end + n_tam:]
+                if len(conteudo) != tamanho or endereco + tamanho > len(self.memoria):
+                    return negativa + [0x31]
+                self.memoria[endereco:endereco + tamanho] = conteudo
+                return [0x7D] + list(dados[:1 + n_end])
+        except IndexError:
+            return negativa + [0x13]  # Tamanho de mensagem incorreto
+        return negativa + [0x11]  # Serviço não suportado
+
+    # --- Barramento ---
+
+    def _quadros(self, dados):
+        """Quadros de resposta: ISO-TP no CAN; quadros de até 7 bytes nos legados"""
+        if self.can:
+            if len(dados) <= 7:
+                return [[len(dados)] + dados]
+            quadros = [[0x10 | len(dados) >> 8, len(dados) & 0xFF] + dados[:6]]
+            for i, inicio in enumerate(range(6, len(dados), 7)):
+                quadros.append([0x20 | (i + 1) & 0x0F] + dados[inicio:inicio + 7])
+            return quadros
+        if len(dados) <= 7:
+            return [dados]
+        if dados[0] == 0x49:
+            # Mode 09 em K-line: sequência + 4 bytes por quadro, completado à esquerda
+            resto = dados[3:]
+            resto = [0] * (-len(resto) % 4) + resto
+            return [dados[:2] + [i + 1] + resto[4 * i:4 * i + 4] for i in range(len(resto) // 4)]
+        return [[0x7F, dados[0] - 0x40, 0x14]]  # Resposta longa demais para o protocolo
+
+    def _formatar(self, quadro):
+        if self.can:
+            quadro = quadro + [0x00] * (8 - len(quadro))
+            cabecalho = [f"{int(self.config.id_ecu, 16) + 8:03X}"]
+        else:
+            # ISO 9141: 48 6B <ECU>; KWP2000: formato com o tamanho, testador F1, <ECU>
+            bytes_cabecalho = [0x48, 0x6B, 0x10] if self.id_elm == "3" else [0x80 | len(quadro), 0xF1, 0x10]
+            cabecalho = [f"{b:02X}" for b in bytes_cabecalho]
+            quadro = quadro + [(sum(bytes_cabecalho) + sum(quadro)) & 0xFF]
+        partes = [f"{b:02X}" for b in quadro]
+        if self.cabecalhos:
+            partes = cabecalho + partes
+        elif not self.can:
+            partes = partes[:-1]  # Sem cabeçalhos o ELM também omite o checksum
+        return (" " if self.espacos else "").join(partes)
+
+    def _atrasar(self, pedido, quadros, caracteres):
+        """Latência da ECU + tempo no barramento + tempo na serial do adaptador"""
+        if self.can:
+            n_pedido = 1 if len(pedido) <= 7 else -(-(len(pedido) + 1) // 7) + 1
+            n = n_pedido + len(quadros) + (1 if len(quadros) > 1 else 0)  # + controle de fluxo
+            barramento = n * BITS_POR_QUADRO_CAN / self.config.baudrate
+        else:
+            # 10 bits por byte; cada quadro tem 3 de cabeçalho e 1 de checksum
+            n = len(pedido) + 4 + sum(len(q) + 4 for q in quadros)
+            barramento = n * 10 / self.config.baudrate
+        serial = 0.0
+        if self.baud_serial:
+            texto = sum(3 * (len(q) + 4) for q in quadros) or 9
+            serial = (caracteres + 1 + texto) * 10 / self.baud_serial
+        time.sleep(self.latencia + barramento + serial)
+
+if __name__ == "__main__":
+    import sys
+    protocolo = sys.argv[1] if len(sys.argv) > 1 else "CAN_11_500"
+    with EmuladorELM327(protocolo) as emulador:
+        print(f"ELM327 emulado ({protocolo}) em {emulador.porta} — Ctrl+C para sair")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
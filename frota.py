@@ -0,0 +1,91 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from ecu_core import ECU
+from controle_malha_fechada import GerenciadorControleBanco
+
+@dataclass
+class ResultadoVeiculo:
+    indice: int
+    config: dict
+    dados: dict  # coluna -> array float32
+
+    def to_dataframe(self, tempos=None):
+        df = pd.DataFrame(self.dados)
+        if tempos is not None:
+            df.insert(0, 'timestamp', tempos)
+        return df
+
+def _compactar(dados):
+    """Colunas em float32; o tempo é comum à frota e não é repetido"""
+    return {k: np.asarray(v, dtype=np.float32) for k, v in dados.items() if k != 'timestamp'}
+
+def _simular_veiculo(args):
+    indice, config, tempos, seed = args
+    ecu = ECU(config, seed=seed)
+    return ResultadoVeiculo(indice, config, _compactar(ecu.cycle_batch(tempos)))
+
+def simular_frota_processos(configs, tempos, seed=0, processos=None):
+    """Um veículo por tarefa, distribuído em um pool de processos"""
+    processos = processos or os.cpu_count() or 1
+    tarefas = [(i, cfg, tempos, seed + i) for i, cfg in enumerate(configs)]
+    if processos == 1:
+        return [_simular_veiculo(t) for t in tarefas]
+
+    chunksize = max(1, len(tarefas) // (processos * 4))
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        return list(pool.map(_simular_veiculo, tarefas, chunksize=chunksize))
+
+def simular_frota_banco(configs, tempos, seed=0):
+    """Todos os veículos num processo, com a malha fechada em banco.
+
+    Só o controle é agrupado: um banco de controladores (um por veículo)
+    roda passo a passo sobre arrays (veículos x tempo). Os sensores ainda
+    são gerados veículo a veículo, pelo mesmo SensorManager.read_all_batch
+    (e o mesmo gerador aleatório) do modo por processos, então sensores e
+    correções saem idênticos aos dele.
+    """
+    tempos = np.asarray(tempos, dtype=float)
+    n, v = len(tempos), len(configs)
+    ecus = [ECU(cfg, seed=seed + i) for i, cfg in enumerate(configs)]
+
+    # Sensores pelo mesmo modelo em lote do ECU.cycle_batch (mesmo gerador por veículo)
+    leituras = [ecu.sensors.read_all_batch(tempos) for ecu in ecus]
+    rpm = np.stack([l['rpm'] for l in leituras])
+    lambda_ = np.stack([l['lambda'] for l in leituras])
+    knock = np.stack([l['knock'] for l in leituras])
+    lambda_alvo = np.stack([ecu.mapa_lambda.valores(l['rpm'], l['tps'])
+                            for ecu, l in zip(ecus, leituras)])
+
+    # Malha fechada: o tempo é sequencial, os veículos vão juntos no banco
+    controle = GerenciadorControleBanco(v)
+    correcoes = {nome: np.empty((v, n)) for nome in ('corr_marcha', 'corr_lambda', 'corr_knock')}
+    for k in range(n):
+        passo = controle.atualizar({'timestamp': tempos[k], 'rpm': rpm[:, k],
+                                    'lambda': lambda_[:, k], 'lambda_alvo': lambda_alvo[:, k],
+                                    'knock': knock[:, k]})
+        for nome, valores in passo.items():
+            correcoes[nome][:, k] = valores
+
+    resultados = []
+    for i, (ecu, dados) in enumerate(zip(ecus, leituras)):
+        dados['ve'] = ecu.mapa_ve.valores(dados['rpm'], dados['tps'])
+        dados['lambda_alvo'] = lambda_alvo[i]
+        dados['inj_ms'] = ecu.calcular_injecao_batch(dados)
+        dados.update({nome: valores[i] for nome, valores in correcoes.items()})
+        resultados.append(ResultadoVeiculo(i, configs[i], _compactar(dados)))
+    return resultados
+
+def simular_frota(configs, duracao_segundos=600, intervalo=0.5, seed=0,
+                  modo="processos", processos=None):
+    """Simula uma lista de configurações de motor (ver CONFIG_MOTOR)"""
+    tempos = np.arange(0, duracao_segundos, intervalo)
+    if modo == "banco":
+        resultados = simular_frota_banco(configs, tempos, seed)
+    elif modo == "processos":
+        resultados = simular_frota_processos(configs, tempos, seed, processos)
+    else:
+        raise ValueError(f"Modo de simulação desconhecido: {modo}")
+    return tempos, resultados
@@ -0,0 +1,101 @@
+import os
+import numpy as np
+import plotly.offline
+import streamlit as st
+import streamlit.components.v1 as components
+from downsample import reduzir_serie
+
+DIRETORIO_COMPONENTE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    "componentes", "grafico_vivo")
+
+def _declarar_componente():
+    # plotly.js vem da instalação do plotly (painel funciona sem internet)
+    plotly_js = os.path.join(DIRETORIO_COMPONENTE, "plotly.min.js")
+    if not os.path.exists(plotly_js):
+        with open(plotly_js, "w", encoding="utf-8") as f:
+            f.write(plotly.offline.get_plotlyjs())
+    return components.declare_component("grafico_vivo", path=DIRETORIO_COMPONENTE)
+
+_componente = _declarar_componente()
+
+def _lista(valores):
+    """Lista JSON-compatível (NaN/inf viram null)"""
+    valores = np.asarray(valores, dtype=float)
+    return np.where(np.isfinite(valores), valores, None).tolist()
+
+class GraficoVivo:
+    """Gráfico Plotly mantido no navegador, que recebe só os pontos novos.
+
+    A figura vai inteira uma vez (com a janela inicial reduzida por
+    downsample); depois cada `atualizar()` manda só as linhas anexadas desde o
+    anterior, aplicadas com Plotly.extendTraces, e o navegador descarta o que
+    passa de `max_pontos`. Payload por tick e memória do navegador ficam
+    constantes. Se o navegador perde a sequência (iframe recriado, lote
+    pulado), ele pede a figura de novo pelo valor do componente.
+
+    Guarde a instância em st.session_state e chame dentro de um st.fragment
+    (a chave do componente só pode aparecer uma vez por execução).
+    """
+    def __init__(self, chave, titulo, tracos, max_pontos=1000, altura=300,
+                 coluna_x="tempo", titulo_x=None):
+        self.chave = chave
+        self.tracos = tracos  # [(coluna, nome, cor)]
+        self.max_pontos = max_pontos
+        self.coluna_x = coluna_x
+        self.layout = {"title": {"text": titulo}, "height": altura,
+                       "margin": {"l": 50, "r": 20, "t": 40, "b": 40}}
+        if titulo_x:
+            self.layout["xaxis"] = {"title": {"text": titulo_x}}
+        self.versao = 0
+        self.lote = 0
+        self.ultimo_x = None  # Último x já enviado ao navegador
+        self.colunas = None
+        self.pedido_atendido = None
+
+    def _reiniciar(self):
+        self.versao += 1
+        self.ultimo_x = None
+
+    def atualizar(self, df, max_pontos=None, metodo="minmax", janela_x=0.0):
+        """Envia ao navegador as linhas de df com x além do último enviado"""
+        if max_pontos and max_pontos != self.max_pontos:
+            self.max_pontos = max_pontos
+            self._reiniciar()
+        pedido = st.session_state.get(self.chave)
+        if pedido is not None and pedido != self.pedido_atendido:
+            self.pedido_atendido = pedido
+            self._reiniciar()
+
+        colunas = [c for c, _, _ in self.tracos if c in df.columns]
+        if colunas != self.colunas:
+            self.colunas = colunas
+            self._reiniciar()
+        if df.empty or not colunas:
+            return
+
+        x = df[self.coluna_x].to_numpy()
+        if self.ultimo_x is not None and x[-1] < self.ultimo_x:
+            self._reiniciar()  # Log recomeçou
+
+        args = {"versao": self.versao, "max_pontos": self.max_pontos, "janela": janela_x}
+        if self.ultimo_x is None:
+            # Figura completa: a janela inicial reduzida, cada traço com seu x
+            tracos = []
+            for coluna, nome, cor in self.tracos:
+                if coluna in colunas:
+                    xr, yr = reduzir_serie(x, df[coluna].to_numpy(), self.max_pontos, metodo)
+                    tracos.append({"x": _lista(xr), "y": _lista(yr), "name": nome,
+                                   "mode": "lines", "line": {"color": cor}})
+            self.lote = 0
+            args.update(completo=True, tracos=tracos, layout=self.layout, lote=self.lote)
+        else:
+            novos = x > self.ultimo_x
+            if not novos.any():
+                novos = slice(0, 0)  # Reenvia o lote vazio: o navegador ignora lote repetido
+            else:
+                self.lote += 1
+            linhas = df[novos].iloc[-self.max_pontos:]
+            args.update(completo=False, lote=self.lote, x=_lista(linhas[self.coluna_x]),
+                        ys=[_lista(linhas[c]) for c in colunas])
+        self.ultimo_x = x[-1]
+        _componente(**args, key=self.chave, default=None)
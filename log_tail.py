@@ -0,0 +1,92 @@
+import io
+import os
+import threading
+import pandas as pd
+
+class LogTailer:
+    """Lê só as linhas novas de um log CSV, guardando o offset em bytes"""
+    def __init__(self, caminho="log_ecu_simulada.csv", janela=5000, coluna_tempo="timestamp"):
+        self.caminho = caminho
+        self.janela = janela  # Máximo de linhas mantidas em memória
+        self.coluna_tempo = coluna_tempo
+        self._trava = threading.Lock()  # Pode ser compartilhado entre sessões do painel
+        self._reiniciar(None)
+
+    def _reiniciar(self, identidade):
+        self.identidade = identidade  # (dispositivo, inode) do arquivo atual
+        self.prefixo = None  # Cabeçalho + primeira linha, para reconhecer o mesmo arquivo
+        self.offset = 0
+        self.colunas = None
+        self.t_inicial = None
+        self.df = pd.DataFrame()
+
+    def ler(self):
+        """Retorna a janela atual com as linhas anexadas desde a última leitura"""
+        with self._trava:
+            return self._ler()
+
+    def _ler(self):
+        try:
+            stat = os.stat(self.caminho)
+        except FileNotFoundError:
+            return self.df
+
+        # Arquivo trocado (rotação/reescrita) ou truncado: recomeça do zero
+        identidade = (stat.st_dev, stat.st_ino)
+        if identidade != self.identidade or stat.st_size < self.offset:
+            self._reiniciar(identidade)
+
+        if stat.st_size == self.offset:
+            return self.df
+
+        with open(self.caminho, "rb") as f:
+            if self.prefixo is not None and f.read(len(self.prefixo)) != self.prefixo:
+                # Recriado com o mesmo inode (ex.: LogWriter com sobrescrever) ou com cabeçalho novo
+                self._reiniciar(identidade)
+            if self.colunas is None and not self._ler_cabecalho(f, stat.st_size):
+                return self.df
+            f.seek(self.offset)
+            dados = f.read(stat.st_size - self.offset)
+
+        # Só processa linhas completas; o resto fica para o próximo tick
+        fim = dados.rfind(b"\n")
+        if fim < 0:
+            return self.df
+        self.offset += fim + 1
+
+        novos = pd.read_csv(io.BytesIO(dados[:fim + 1]), header=None, names=self.colunas)
+        if len(novos) > self.janela:
+            novos = novos.iloc[-self.janela:]
+        if self.t_inicial is not None:
+            novos["tempo"] = novos[self.coluna_tempo] - self.t_inicial
+
+        if self.df.empty:
+            self.df = novos.reset_index(drop=True)
+        else:
+            self.df = pd.concat([self.df, novos], ignore_index=True).iloc[-self.janela:]
+        return self.df
+
+    def _ler_cabecalho(self, f, tamanho):
+        """Lê cabeçalho e primeira linha; posiciona o offset perto do fim do arquivo"""
+        f.seek(0)
+        cabecalho = f.readline()
+        primeira = f.readline()
+        if not cabecalho.endswith(b"\n") or not primeira.endswith(b"\n"):
+            return False
+
+        self.prefixo = cabecalho + primeira
+        self.colunas = cabecalho.decode().strip().split(",")
+        inicio_dados = len(cabecalho)
+        if self.coluna_tempo in self.colunas:
+            linha = pd.read_csv(io.BytesIO(primeira), header=None, names=self.colunas)
+            self.t_inicial = linha[self.coluna_tempo].iloc[0]
+
+        # Estima onde começam as últimas `janela` linhas e pula o resto
+        salto = tamanho - int(len(primeira) * 2 * self.janela)
+        if salto > inicio_dados:
+            f.seek(salto)
+            f.readline()  # Descarta a linha parcial
+            self.offset = f.tell()
+        else:
+            self.offset = inicio_dados
+        return True
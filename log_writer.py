@@ -0,0 +1,103 @@
+import csv
+import os
+import time
+
+class LogWriter:
+    """Grava o log da ECU em modo append, escrevendo só as linhas novas"""
+    def __init__(self, caminho="log_ecu_simulada.csv", colunas=None,
+                 max_linhas=20, max_intervalo=1.0, sobrescrever=True):
+        self.caminho = caminho
+        self.colunas = list(colunas) if colunas else []
+        self.max_linhas = max_linhas  # Flush quando o buffer atinge N linhas
+        self.max_intervalo = max_intervalo  # ... ou após N segundos
+        self.buffer = []
+        self.linhas_escritas = 0
+        self.ultimo_flush = time.monotonic()
+        self._arquivo = None
+        self._writer = None
+
+        if sobrescrever and os.path.exists(caminho):
+            os.remove(caminho)
+        elif os.path.exists(caminho) and os.path.getsize(caminho) > 0:
+            # Continua um log existente mantendo o cabeçalho dele
+            with open(caminho, "r", newline="") as f:
+                cabecalho = next(csv.reader(f), [])
+            extras = [c for c in self.colunas if c not in cabecalho]
+            self.colunas = cabecalho
+            if extras:
+                self._expandir_cabecalho(extras)
+
+    def escrever(self, registro):
+        """Adiciona um registro ao buffer e faz flush conforme a política"""
+        self.buffer.append(dict(registro))
+        if (len(self.buffer) >= self.max_linhas or
+                time.monotonic() - self.ultimo_flush >= self.max_intervalo):
+            self.flush()
+
+    def flush(self):
+        """Grava as linhas pendentes no fim do arquivo"""
+        self.ultimo_flush = time.monotonic()
+        if not self.buffer:
+            return
+
+        novas = []
+        for registro in self.buffer:
+            for chave in registro:
+                if chave not in self.colunas and chave not in novas:
+                    novas.append(chave)
+
+        if novas:
+            self._expandir_cabecalho(novas)
+        if self._writer is None:
+            self._abrir()
+
+        self._writer.writerows(self.buffer)
+        self._arquivo.flush()
+        self.linhas_escritas += len(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        if self._arquivo:
+            self._arquivo.close()
+            self._arquivo = None
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _abrir(self):
+        novo = not os.path.exists(self.caminho) or os.path.getsize(self.caminho) == 0
+        self._arquivo = open(self.caminho, "a", newline="")
+        self._writer = csv.DictWriter(self._arquivo, fieldnames=self.colunas,
+                                      restval="", extrasaction="ignore")
+        if novo:
+            self._writer.writeheader()
+
+    def _expandir_cabecalho(self, novas):
+        """Acrescenta colunas novas ao cabeçalho (evento raro, custo O(n) uma vez)"""
+        if self._arquivo:
+            self._arquivo.close()
+            self._arquivo = None
+            self._writer = None
+
+        colunas_antigas = self.colunas
+        self.colunas = colunas_antigas + novas
+        if not os.path.exists(self.caminho) or os.path.getsize(self.caminho) == 0:
+            return
+
+        # Reescreve o arquivo uma única vez com as colunas novas vazias
+        temporario = self.caminho + ".tmp"
+        with open(self.caminho, "r", newline="") as origem, \
+             open(temporario, "w", newline="") as destino:
+            leitor = csv.reader(origem)
+            escritor = csv.writer(destino)
+            next(leitor, None)
+            escritor.writerow(self.colunas)
+            vazias = [""] * len(novas)
+            for linha in leitor:
+                escritor.writerow(linha + vazias)
+        os.replace(temporario, self.caminho)
@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+from bisect import bisect_right
 
 def criar_mapa_lambda_base():
     """Cria mapa lambda base com valores típicos"""
@@ -17,6 +18,12 @@ def criar_mapa_lambda_base():
         columns=[f"{tps}%" for tps in tps_bins]
     )
 
+def criar_mapa_lambda_padrao():
+    """Mapa lambda do painel sem arquivo salvo: estequiométrico em toda a grade"""
+    mapa = criar_mapa_lambda_base()
+    mapa.loc[:, :] = 1.0
+    return mapa
+
 def criar_mapa_ve_base():
     """Cria mapa VE base com valores típicos"""
     rpm_bins = [1000, 2000, 3000, 4000, 5000, 6000, 7000]
@@ -71,3 +78,92 @@ def criar_mapa_aceleracao():
         index=[f"{rpm} RPM" for rpm in rpm_bins],
         columns=[f"{d}% TPS" for d in delta_tps_bins]
     )
+
+def _eixo_numerico(rotulos):
+    """Converte rótulos como "3000 RPM", "25%" ou "5% TPS" em números"""
+    try:
+        return np.array([float(str(r).split()[0].rstrip('%')) for r in rotulos])
+    except (ValueError, IndexError):
+        raise ValueError(f"Rótulo de eixo inválido em {list(rotulos)}") from None
+
+class Mapa2D:
+    """Mapa com eixos numéricos e interpolação bilinear (saturada nas bordas).
+
+    `valor` atende um ponto com listas Python (sem overhead do NumPy);
+    `valores` atende lotes de pontos com arrays.
+    """
+    def __init__(self, eixo_x, eixo_y, valores):
+        x = np.asarray(eixo_x, dtype=float)
+        y = np.asarray(eixo_y, dtype=float)
+        v = np.asarray(valores, dtype=float)
+        if v.shape != (len(x), len(y)):
+            raise ValueError(f"Formato {v.shape} não bate com os eixos ({len(x)}, {len(y)})")
+        if not (np.isfinite(x).all() and np.isfinite(y).all() and np.isfinite(v).all()):
+            raise ValueError("Mapa com eixo ou valor vazio/não numérico")
+        if len(np.unique(x)) != len(x) or len(np.unique(y)) != len(y):
+            raise ValueError("Mapa com ponto de eixo repetido")
+
+        # Eixos crescentes; um eixo com um único ponto vira um eixo constante
+        ox, oy = np.argsort(x), np.argsort(y)
+        x, y, v = x[ox], y[oy], v[ox][:, oy]
+        if len(x) == 1:
+            x, v = np.array([x[0], x[0] + 1]), np.vstack([v, v])
+        if len(y) == 1:
+            y, v = np.array([y[0], y[0] + 1]), np.hstack([v, v])
+
+        self.eixo_x = x
+        self.eixo_y = y
+        self.tabela = np.ascontiguousarray(v)
+
+        # Cópias em listas Python para a busca de um ponto só
+        self._lookup = (x.tolist(), y.tolist(),
+                        (1.0 / np.diff(x)).tolist(), (1.0 / np.diff(y)).tolist(),
+                        v.ravel().tolist(), len(y))
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Cria o mapa a partir das tabelas de mapas_base (linhas = RPM)"""
+        return cls(_eixo_numerico(df.index), _eixo_numerico(df.columns), df.values)
+
+    def valor(self, x, y):
+        """Interpola um único ponto"""
+        xs, ys, inv_dx, inv_dy, v, nc = self._lookup
+        if x <= xs[0]:
+            i, fx = 0, 0.0
+        elif x >= xs[-1]:
+            i, fx = len(xs) - 2, 1.0
+        else:
+            i = bisect_right(xs, x) - 1
+            fx = (x - xs[i]) * inv_dx[i]
+
+        if y <= ys[0]:
+            j, fy = 0, 0.0
+        elif y >= ys[-1]:
+            j, fy = nc - 2, 1.0
+        else:
+            j = bisect_right(ys, y) - 1
+            fy = (y - ys[j]) * inv_dy[j]
+
+        k = i * nc + j
+        a = v[k] + (v[k + 1] - v[k]) * fy
+        b = v[k + nc] + (v[k + nc + 1] - v[k + nc]) * fy
+        return a + (b - a) * fx
+
+    def valores(self, x, y):
+        """Interpola lotes de pontos (arrays de mesmo formato)"""
+        xs, ys, inv_dx, inv_dy, _, _ = self._lookup
+        i, fx = self._indices(self.eixo_x, np.asarray(inv_dx), np.asarray(x, dtype=float))
+        j, fy = self._indices(self.eixo_y, np.asarray(inv_dy), np.asarray(y, dtype=float))
+
+        t = self.tabela
+        a = t[i, j] + (t[i, j + 1] - t[i, j]) * fy
+        b = t[i + 1, j] + (t[i + 1, j + 1] - t[i + 1, j]) * fy
+        return a + (b - a) * fx
+
+    @staticmethod
+    def _indices(eixo, inv_d, pontos):
+        # Mesma aritmética de `valor`, para resultados idênticos
+        p = np.clip(pontos, eixo[0], eixo[-1])
+        i = np.clip(np.searchsorted(eixo, p, side='right') - 1, 0, len(eixo) - 2)
+        f = np.where(p >= eixo[-1], 1.0, (p - eixo[i]) * inv_d[i])
+        return i, f
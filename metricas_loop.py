@@ -0,0 +1,138 @@
+import json
+import math
+import os
+import time
+
+SUBDIVISOES = 8  # Buckets por oitava: erro de no máximo ~9% nos percentis
+OITAVAS = 40  # Até 2^40 ns (~18 min)
+
+class Histograma:
+    """Histograma de latências em buckets logarítmicos (contagem fixa, sem guardar amostras)"""
+    def __init__(self):
+        self.contagens = [0] * (OITAVAS * SUBDIVISOES)
+        self.n = 0
+        self.soma = 0
+        self.maximo = 0
+
+    def registrar(self, ns):
+        if ns <= 0:
+            indice = 0
+        else:
+            mantissa, expoente = math.frexp(ns)  # ns = mantissa * 2^expoente, 0.5 <= mantissa < 1
+            indice = min(expoente * SUBDIVISOES + int((mantissa - 0.5) * 2 * SUBDIVISOES),
+                         len(self.contagens) - 1)
+        self.contagens[indice] += 1
+        self.n += 1
+        self.soma += ns
+        if ns > self.maximo:
+            self.maximo = ns
+
+    def percentil(self, p):
+        """Limite superior (ns) do bucket que contém o percentil p (0-100)"""
+        if not self.n:
+            return 0.0
+        alvo = p / 100 * self.n
+        acumulado = 0
+        for indice, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo and contagem:
+                expoente, sub = divmod(indice, SUBDIVISOES)
+                limite = (0.5 + (sub + 1) / (2 * SUBDIVISOES)) * 2.0 ** expoente
+                return min(limite, self.maximo)
+        return float(self.maximo)
+
+    def resumo(self):
+        """Estatísticas em ms"""
+        return {
+            "n": self.n,
+            "media_ms": self.soma / self.n / 1e6 if self.n else 0.0,
+            "p50_ms": self.percentil(50) / 1e6,
+            "p95_ms": self.percentil(95) / 1e6,
+            "p99_ms": self.percentil(99) / 1e6,
+            "max_ms": self.maximo / 1e6,
+        }
+
+class MetricasLoop:
+    """Tempo por etapa de cada tick do loop e estouros do intervalo.
+
+    Uso: `t = m.inicio()` e, ao fim de cada etapa, `t = m.registrar("etapa", t)`.
+    Desligada, as chamadas retornam 0 sem medir nada. O resumo é gravado em
+    JSON (substituição atômica) a cada `intervalo_dump` segundos.
+    """
+    def __init__(self, caminho="metricas_ecu.json", intervalo=0.5,
+                 intervalo_dump=5.0, ativo=True):
+        self.caminho = caminho
+        self.intervalo = intervalo
+        self.intervalo_dump = intervalo_dump
+        self.ativo = ativo
+        self.etapas = {}  # nome -> Histograma
+        self.ticks = 0
+        self.overruns = 0
+        self.pior_overrun_ms = 0.0
+        self.contadores = {}  # Valores extras do resumo (ex.: prazos perdidos do agendador)
+        self.filas = {}  # nome -> objeto com resumo() (ex.: pipeline_aquisicao.FilaAmostras)
+        self.inicio_execucao = time.time()
+        self._ultimo_dump = time.monotonic()
+
+    def inicio(self):
+        return time.perf_counter_ns() if self.ativo else 0
+
+    def registrar(self, etapa, inicio):
+        """Registra o tempo desde `inicio` na etapa e retorna o instante atual"""
+        if not self.ativo:
+            return 0
+        agora = time.perf_counter_ns()
+        self.registrar_duracao(etapa, agora - inicio)
+        return agora
+
+    def registrar_duracao(self, etapa, ns):
+        if not self.ativo:
+            return
+        histograma = self.etapas.get(etapa)
+        if histograma is None:
+            histograma = self.etapas[etapa] = Histograma()
+        histograma.registrar(ns)
+
+    def fim_tick(self, inicio_tick, trabalho_ns=None):
+        """Fecha um tick: conta estouro quando o trabalho passou do intervalo"""
+        if not self.ativo:
+            return
+        agora = self.registrar("tick", inicio_tick)
+        trabalho = (agora - inicio_tick) if trabalho_ns is None else trabalho_ns
+        self.ticks += 1
+        excesso_ms = trabalho / 1e6 - self.intervalo * 1000
+        if excesso_ms > 0:
+            self.overruns += 1
+            self.pior_overrun_ms = max(self.pior_overrun_ms, excesso_ms)
+        if time.monotonic() - self._ultimo_dump >= self.intervalo_dump:
+            self.gravar()
+
+    def resumo(self):
+        return {
+            "atualizado_em": time.time(),
+            "inicio": self.inicio_execucao,
+            "intervalo_s": self.intervalo,
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "pior_overrun_ms": self.pior_overrun_ms,
+            "contadores": dict(self.contadores),
+            "filas": {nome: fila.resumo() for nome, fila in self.filas.items()},
+            "etapas": {nome: h.resumo() for nome, h in self.etapas.items()},
+        }
+
+    def gravar(self):
+        self._ultimo_dump = time.monotonic()
+        if not (self.ativo and self.caminho):
+            return
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w") as f:
+            json.dump(self.resumo(), f, indent=2)
+        os.replace(temporario, self.caminho)
+
+def carregar_metricas(caminho="metricas_ecu.json"):
+    """Resumo gravado por MetricasLoop, ou None se ainda não existe"""
+    try:
+        with open(caminho, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
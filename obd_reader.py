@@ -1,12 +1,69 @@
 import obd
 import time
 import serial.tools.list_ports
+from obd.decoders import encoded_string
+from obd.protocols.protocol import Message
+from pid_decoders import decode_wideband, decode_boost, decode_percent
+from agendador_obd import AgendadorOBD
+from cache_veiculos import CacheVeiculos
+
+MAX_PIDS_POR_REQUISICAO = 6  # Limite do ISO 15765-4 para Mode 01
+PROTOCOLOS_CAN = {"6", "7", "8", "9"}
+
+# O python-OBD não tem como conectar sem descobrir os PIDs: ConexaoOBD
+# substitui o método privado que o construtor chama (testado na 0.7.3, fixada
+# em requirements.txt). Se ele mudar de nome, a descoberta volta a rodar sempre.
+_CARREGAR_COMANDOS = getattr(obd.OBD, "_OBD__load_commands", None)
+
+class ConexaoOBD(obd.OBD):
+    """obd.OBD que pode pular a descoberta de PIDs suportados no construtor"""
+    def __init__(self, *args, descobrir=True, **kwargs):
+        self.descobrir = descobrir
+        if not descobrir and _CARREGAR_COMANDOS is None:
+            print("Aviso: esta versão do python-OBD não permite pular a descoberta de PIDs")
+        super().__init__(*args, **kwargs)
+    
+    def _OBD__load_commands(self):
+        if self.descobrir:
+            self.descobrir_comandos()
+    
+    def descobrir_comandos(self):
+        # Sem o método privado, o construtor já fez a descoberta
+        if _CARREGAR_COMANDOS is not None:
+            _CARREGAR_COMANDOS(self)
+
+def _comando_padrao(*nomes):
+    """Primeiro comando do python-OBD que existe entre os nomes (varia entre versões), ou None"""
+    for nome in nomes:
+        if obd.commands.has_name(nome):
+            return obd.commands[nome]
+    return None
+
+CMD_CAL_ID = _comando_padrao("CALIBRATION_ID", "CAL_ID")
+# ECUNAME (Mode 09 PID 0A) não existe no python-OBD 0.7
+CMD_ECU_NAME = _comando_padrao("ECU_NAME") or \
+    obd.OBDCommand("ECU_NAME", "ECU name", b"090A", 22, encoded_string(20))
+
+def _comandos_por_string():
+    """Comandos do python-OBD indexados pela string enviada (ex.: "010C")"""
+    return {cmd.command.decode(): cmd
+            for mode in obd.commands.modes for cmd in mode if cmd}
 
 class OBDReader:
-    def __init__(self, port=None, bluetooth=True):
+    def __init__(self, port=None, bluetooth=True, multi_pid=True, taxas=None,
+                 cache_path="cache_veiculos.json"):
         self.connection = None
         self.port = port
         self.bluetooth = bluetooth
+        self.cache = CacheVeiculos(cache_path) if cache_path else None
+        self.info_veiculo = None
+        self.tempo_conexao = None
+        self.multi_pid = multi_pid  # Agrupa PIDs Mode 01 numa só requisição (CAN)
+        self.max_pids_por_requisicao = MAX_PIDS_POR_REQUISICAO
+        self.amostras_por_segundo = 0.0
+        
+        # Escalonador por taxa alvo de cada PID (ver agendador_obd.TAXAS_PADRAO)
+        self.agendador = AgendadorOBD(self, taxas)
         
         # Expandir comandos com mais sensores
         self.commands = {
@@ -33,18 +90,21 @@ class OBDReader:
             
             # Sensores de ignição
             'timing': obd.commands.TIMING_ADVANCE,
-            'spark_advance': obd.commands.SPARK_ADVANCE_B1,
+            'spark_advance': _comando_padrao("SPARK_ADVANCE_B1"),
             
             # Sensores de diagnóstico
             'voltage': obd.commands.ELM_VOLTAGE,
             'dtc_status': obd.commands.STATUS
         }
+        # Sem equivalente na versão instalada do python-OBD
+        self.commands = {nome: cmd for nome, cmd in self.commands.items() if cmd is not None}
         
         # Adiciona PIDs customizados
         self.custom_commands = {
-            'wideband': obd.OBDCommand('WIDEBAND', 'Wideband O2', b'01 24', 2, decode_wideband),
-            'egr': obd.OBDCommand('EGR_PCT', 'EGR Percentage', b'01 2C', 1, decode_percent),
-            'boost': obd.OBDCommand('BOOST', 'Boost Pressure', b'01 0B', 1, decode_boost)
+            # Tamanho inclui os bytes de modo e PID, como nos comandos do python-OBD
+            'wideband': obd.OBDCommand('WIDEBAND', 'Wideband O2', b'01 24', 6, decode_wideband),
+            'egr': obd.OBDCommand('EGR_PCT', 'EGR Percentage', b'01 2C', 3, decode_percent),
+            'boost': obd.OBDCommand('BOOST', 'Boost Pressure', b'01 0B', 3, decode_boost)
         }
         
     def find_obd_port(self):
@@ -67,17 +127,63 @@ class OBDReader:
             if not self.port:
                 raise ConnectionError("Nenhum adaptador OBD encontrado")
         
+        inicio = time.time()
         try:
-            self.connection = obd.OBD(self.port)
+            # Com cache, a descoberta de PIDs só roda se o veículo não for conhecido
+            dica = self.cache.protocolo_da_porta(self.port) if self.cache else None
+            self.connection = ConexaoOBD(self.port, protocol=dica, descobrir=self.cache is None)
+            if not self.connection.is_connected() and dica:
+                # Outro veículo na mesma porta: volta para detecção automática
+                self.connection.close()
+                self.connection = ConexaoOBD(self.port, descobrir=False)
             if not self.connection.is_connected():
                 raise ConnectionError("Não foi possível conectar ao OBD-II")
+            # PIDs customizados não aparecem na descoberta (ver add_custom_pid)
+            self.connection.supported_commands.update(self.custom_commands.values())
+            
+            origem = self._carregar_veiculo() if self.cache else "descoberta"
+            self.tempo_conexao = time.time() - inicio
             
             print(f"Conectado na porta: {self.port}")
             print(f"Protocolo: {self.connection.protocol_name()}")
+            print(f"Conexão em {self.tempo_conexao:.2f}s ({origem})")
             
         except Exception as e:
             print(f"Erro de conexão: {e}")
             raise
+    
+    def _carregar_veiculo(self):
+        """Aplica o cache do veículo (VIN + calibração) ou faz a descoberta e grava"""
+        vin = self._consultar_texto(obd.commands.VIN)
+        cal_id = self._consultar_texto(CMD_CAL_ID)
+        entrada = self.cache.buscar(vin, cal_id) if vin else None
+        
+        if entrada and entrada["protocolo_id"] == self.connection.protocol_id():
+            comandos = _comandos_por_string()
+            self.connection.supported_commands.update(
+                comandos[c] for c in entrada["comandos"] if c in comandos)
+            self.info_veiculo = dict(entrada["info"])
+            return "cache"
+        
+        self.connection.descobrir_comandos()
+        self.info_veiculo = self._ler_info_veiculo()
+        if vin:
+            info = {k: str(v) for k, v in self.info_veiculo.items() if k != 'voltage'}
+            self.cache.salvar(vin, cal_id, self.connection.protocol_id(),
+                              [cmd.command.decode() for cmd in self.connection.supported_commands],
+                              info, porta=self.port)
+        return "descoberta"
+    
+    def _consultar_texto(self, cmd):
+        """Valor textual (VIN, calibração, nome da ECU) como str, ou None"""
+        response = self.connection.query(cmd, force=True)
+        if response.is_null():
+            return None
+        valor = response.value
+        if isinstance(valor, (bytes, bytearray)):
+            # python-OBD entrega VIN/CAL_ID como bytearray
+            return valor.decode(errors="ignore").strip()
+        return str(valor)
             
     def get_supported_commands(self):
         """Retorna lista de comandos suportados pelo veículo"""
@@ -93,28 +199,124 @@ class OBDReader:
         response = self.connection.query(obd.commands.GET_DTC)
         return response.value if not response.is_null() else []
     
-    def read_sensor(self, command_name):
+    def _comando(self, command_name):
         if command_name in self.commands:
-            response = self.connection.query(self.commands[command_name])
+            return self.commands[command_name]
+        return self.custom_commands.get(command_name)
+        
+    def read_sensor(self, command_name):
+        cmd = self._comando(command_name)
+        if cmd is not None:
+            response = self.connection.query(cmd)
             if response.is_null():
                 return None
             return response.value
         return None
         
-    def read_all(self):
+    def read_all(self, orcamento=None, nomes=None):
+        """Lê os PIDs vencidos segundo a taxa de cada um e retorna o último valor de todos.
+
+        A idade de cada valor fica em `self.agendador.ultimos()`.
+        """
         if not self.connection:
             self.connect()
             
+        nomes = list(nomes or self.commands)
+        inicio = time.time()
+        self.agendador.executar(nomes, orcamento)
         data = {
-            'timestamp': time.time(),
+            'timestamp': inicio,
+            **self.agendador.valores(nomes),
         }
         
-        for name in self.commands:
+        self._registrar_taxa(time.time() - inicio)
+        return data
+    
+    def consultar(self, nomes):
+        """Consulta um grupo de sensores, em multi-PID quando possível"""
+        valores = {}
+        pendentes = list(nomes)
+        elegiveis = [n for n in pendentes if self.elegivel_multi_pid(n)]
+        for i in range(0, len(elegiveis), MAX_PIDS_POR_REQUISICAO):
+            lote = elegiveis[i:i + MAX_PIDS_POR_REQUISICAO]
+            if len(lote) < 2:
+                break
+            resposta = self.query_multi([self.commands[n] for n in lote])
+            if resposta is None:
+                # Adaptador recusou: se a leitura simples funcionar, desliga o modo
+                value = self.read_sensor(lote[0])
+                pendentes.remove(lote[0])
+                if value is not None:
+                    valores[lote[0]] = value
+                    print("Adaptador não aceita multi-PID, usando consultas simples")
+                    self.multi_pid = False
+                    break
+                continue
+            valores.update(resposta)
+            pendentes = [n for n in pendentes if n not in resposta]
+        
+        for name in pendentes:
             value = self.read_sensor(name)
             if value is not None:
-                data[name] = value
-                
-        return data
+                valores[name] = value
+        return valores
+    
+    def elegivel_multi_pid(self, command_name):
+        """PID Mode 01 suportado que pode ir numa requisição multi-PID"""
+        if not (self.multi_pid and self.connection and
+                self.connection.protocol_id() in PROTOCOLOS_CAN):
+            return False
+        cmd = self.commands.get(command_name)
+        return (cmd is not None and cmd.mode == 1 and bool(cmd.pid) and
+                cmd.bytes > 2 and self.connection.supports(cmd))
+    
+    def query_multi(self, comandos):
+        """Envia vários PIDs Mode 01 numa requisição e decodifica cada parte.
+
+        Retorna {nome: valor} para os PIDs respondidos, ou None se o adaptador
+        não devolveu uma resposta multi-PID válida.
+        """
+        pids = "".join(f"{cmd.pid:02X}" for cmd in comandos)
+        requisicao = obd.OBDCommand("MULTI_PID", "Multi PID", b"01" + pids.encode(),
+                                    0, lambda messages: messages, fast=False)
+        response = self.connection.query(requisicao, force=True)
+        if response.is_null():
+            return None
+        
+        por_pid = {cmd.pid: (name, cmd) for name, cmd in self.commands.items()
+                   if cmd in comandos}
+        partes = {}
+        for msg in response.value:
+            d = msg.data
+            if len(d) < 2 or d[0] != 0x41:
+                continue
+            i = 1
+            while i < len(d) and d[i] in por_pid:
+                pid = d[i]
+                tamanho = por_pid[pid][1].bytes - 2
+                parte = Message(msg.frames)
+                parte.ecu = msg.ecu
+                parte.data = bytearray([0x41, pid]) + d[i + 1:i + 1 + tamanho]
+                partes.setdefault(pid, []).append(parte)
+                i += 1 + tamanho
+        
+        if not partes:
+            return None
+        
+        valores = {}
+        for pid, messages in partes.items():
+            name, cmd = por_pid[pid]
+            decoded = cmd(messages)  # Decoder original do comando
+            if not decoded.is_null():
+                valores[name] = decoded.value
+        return valores
+    
+    def _registrar_taxa(self, duracao):
+        """Média móvel das amostras completas por segundo"""
+        taxa = 1.0 / duracao if duracao > 0 else 0.0
+        if self.amostras_por_segundo:
+            taxa = 0.8 * self.amostras_por_segundo + 0.2 * taxa
+        self.amostras_por_segundo = taxa
     
     def add_custom_pid(self, name, command_str, bytes_returned, decoder):
         """Adiciona PID customizado"""
@@ -123,49 +325,50 @@ class OBDReader:
         if self.connection:
             self.connection.supported_commands.add(cmd)
 
-    def read_all_advanced(self, include_custom=True):
+    def read_all_advanced(self, include_custom=True, orcamento=None):
         """Leitura avançada com mais informações"""
-        data = self.read_all()
-        
-        # Adiciona status de diagnóstico
-        status = self.connection.query(obd.commands.STATUS)
-        if not status.is_null():
-            data['mil_on'] = status.value.MIL
-            data['dtc_count'] = status.value.DTC_count
+        nomes = list(self.commands)
         
-        # Lê PIDs customizados
+        # PIDs customizados entram no mesmo escalonamento
         if include_custom:
-            for name, cmd in self.custom_commands.items():
-                response = self.connection.query(cmd)
-                if not response.is_null():
-                    data[name] = response.value
+            nomes += list(self.custom_commands)
+        data = self.read_all(orcamento, nomes)
+        
+        # Adiciona status de diagnóstico (vem do PID STATUS já escalonado)
+        status = data.get('dtc_status')
+        if status is not None:
+            data['mil_on'] = status.MIL
+            data['dtc_count'] = status.DTC_count
                     
         return data
 
-    def start_continuous(self, commands):
-        """Inicia leitura contínua de comandos específicos"""
+    def get_vehicle_info(self):
+        """Obtém informações do veículo (do cache, quando disponível)"""
         if not self.connection:
             self.connect()
-        self.connection.start_async(commands)
-
-    def stop_continuous(self):
-        """Para leitura contínua"""
-        if self.connection:
-            self.connection.stop_async()
-            
-    def get_vehicle_info(self):
-        """Obtém informações do veículo"""
+        if self.info_veiculo is None:
+            self.info_veiculo = self._ler_info_veiculo()
+        
+        # Tensão muda a cada leitura: nunca vem do cache
+        info = dict(self.info_veiculo)
+        response = self.connection.query(obd.commands.ELM_VOLTAGE)
+        if not response.is_null():
+            info['voltage'] = response.value
+        return info
+        
+    def _ler_info_veiculo(self):
+        """Consulta as informações do veículo na ECU"""
         info = {}
         
         # VIN
-        response = self.connection.query(obd.commands.VIN)
-        if not response.is_null():
-            info['vin'] = response.value
+        vin = self._consultar_texto(obd.commands.VIN)
+        if vin is not None:
+            info['vin'] = vin
             
         # Nome ECU
-        response = self.connection.query(obd.commands.ECU_NAME)
-        if not response.is_null():
-            info['ecu_name'] = response.value
+        ecu_name = self._consultar_texto(CMD_ECU_NAME)
+        if ecu_name is not None:
+            info['ecu_name'] = ecu_name
             
         # Protocolo
         info['protocol'] = self.connection.protocol_name()
@@ -181,9 +384,9 @@ class OBDReader:
             info['voltage'] = response.value
             
         # Calibração
-        response = self.connection.query(obd.commands.CAL_ID)
-        if not response.is_null():
-            info['cal_id'] = response.value
+        cal_id = self._consultar_texto(CMD_CAL_ID)
+        if cal_id is not None:
+            info['cal_id'] = cal_id
             
         return info
         
@@ -1,13 +1,18 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
 import os
-import time
 import serial.tools.list_ports
-from mapas_base import criar_mapa_lambda_base, criar_mapa_ve_base, criar_mapa_ignicao_base
+from mapas_base import criar_mapa_lambda_padrao, criar_mapa_ve_base, criar_mapa_ignicao_base
 from config_motor import CONFIG_MOTOR
 from obd_reader import OBDReader  # Novo import para OBDReader
 from ecu_mapper import ECUMapper
+from metricas_loop import carregar_metricas
+from canal_controle import enviar_comando, enviar_mapa
+from log_tail import LogTailer
+from cache_arquivos import CacheArquivos
+from telemetria_shm import LeitorTelemetria
+from grafico_vivo import GraficoVivo
+from autotune_mapas import autotune_log
 
 st.set_page_config(page_title="Painel ECU Simulada", layout="wide")
 
@@ -21,12 +26,23 @@ if "rodando" not in st.session_state:
 col_play, col_intervalo = st.sidebar.columns([1, 2])
 if col_play.button("⏯️ Play/Pause"):
     st.session_state.rodando = not st.session_state.rodando
-    # Atualiza arquivo de controle
-    with open("controle_simulacao.txt", "w") as f:
-        f.write("PAUSE" if not st.session_state.rodando else "RUN")
+    # Avisa o simulador pelo canal de controle (efeito no próximo ciclo)
+    enviar_comando("retomar" if st.session_state.rodando else "pausar")
 
 intervalo = col_intervalo.slider("⏱️ Atualizar a cada (s)", 0.5, 5.0, 1.0)
 
+col_ciclo, col_aplicar = st.sidebar.columns([2, 1])
+intervalo_simulacao = col_ciclo.number_input(
+    "⚙️ Ciclo da simulação (s)", min_value=0.001, value=0.5, step=0.05, format="%.3f")
+if col_aplicar.button("Aplicar", key="btn_intervalo_sim"):
+    enviar_comando("intervalo", valor=intervalo_simulacao)
+
+# Janela deslizante dos gráficos (o histórico inicial é reduzido, mantendo picos)
+pontos_por_traco = st.sidebar.slider("📉 Pontos por traço", 200, 5000, 1000, step=100)
+metodo_reducao = st.sidebar.selectbox("Método de redução", ["minmax", "lttb"])
+zoom_segundos = st.sidebar.number_input(
+    "🔍 Zoom: últimos N segundos (0 = tudo)", min_value=0.0, value=0.0, step=10.0)
+
 # --- Configurações de malha
 rpm_bins = [1000, 2000, 3000, 4000, 5000, 6000, 7000]
 tps_bins = [0, 10, 25, 50, 75, 100]  # Em %
@@ -38,14 +54,44 @@ def criar_mapa_vazio():
         columns=[f"{tps}%" for tps in tps_bins]
     )
 
-df = None
 log_path = "log_ecu_simulada.csv"
-if os.path.exists(log_path):
-    try:
-        df = pd.read_csv(log_path)
-    except Exception as e:
-        st.error(f"Erro ao ler dados: {e}")
-        df = pd.DataFrame()  # DataFrame vazio como fallback
+
+# Caches do processo, compartilhados por todas as sessões: um rerun sem mudança
+# no disco custa um os.stat por arquivo
+@st.cache_resource
+def cache_arquivos():
+    return CacheArquivos()
+
+@st.cache_resource
+def leitor_log(caminho):
+    # Leitor incremental: só as linhas anexadas são processadas
+    return LogTailer(caminho, janela=200_000)  # Gráficos são reduzidos, a janela pode ser longa
+
+cache = cache_arquivos()
+tailer = leitor_log(log_path)
+
+def ler_mapa(caminho):
+    return pd.read_csv(caminho, index_col=0)
+
+def telemetria_ao_vivo():
+    """Leitor do anel em memória compartilhada do simulador (None se não estiver rodando)"""
+    leitor = st.session_state.get("telemetria")
+    if leitor is not None and leitor.encerrado:
+        leitor.close()  # Simulador reiniciado: o anel antigo não recebe mais dados
+        leitor = None
+    if leitor is None:
+        try:
+            leitor = LeitorTelemetria()
+        except (FileNotFoundError, ValueError):
+            leitor = None
+        st.session_state.telemetria = leitor
+    return leitor
+
+try:
+    df = tailer.ler()
+except Exception as e:
+    st.error(f"Erro ao ler dados: {e}")
+    df = pd.DataFrame()  # DataFrame vazio como fallback
 
 
 # ================================
@@ -60,38 +106,65 @@ aba = st.tabs(["🟢 Mapa VE", "🔥 Mapa Ignição", "🎯 Mapa Lambda", "🔍
 # --- Mapa VE ---
 with aba[0]:
     st.subheader("Mapa VE")
-    if os.path.exists("mapa_ve.csv"):
-        mapa_ve = pd.read_csv("mapa_ve.csv", index_col=0)
-    else:
-        mapa_ve = criar_mapa_ve_base()  # Usa mapa base ao invés de vazio
+    mapa_ve = cache.ler("mapa_ve.csv", ler_mapa, criar_mapa_ve_base)  # Sem arquivo, usa o mapa base
     mapa_ve_editado = st.data_editor(mapa_ve, num_rows="dynamic", key="mapa_ve_editor")
     if st.button("Salvar Mapa VE", key="btn_salvar_ve"):
         mapa_ve_editado.to_csv("mapa_ve.csv")
+        cache.invalidar("mapa_ve.csv")
+        enviar_mapa("ve", mapa_ve_editado)  # Recarrega na simulação em execução
         st.success("Mapa VE salvo!")
 
+    with st.expander("🤖 Autotune pelo log"):
+        st.caption("Propõe VE e lambda a partir das amostras em regime do log; "
+                   "cada célula anda até o valor medido na proporção da sua confiança.")
+        if st.button("Calcular proposta", key="btn_autotune"):
+            if not os.path.exists(log_path):
+                st.warning(f"Sem log em {log_path}")
+            else:
+                mapa_lambda_atual = cache.ler("mapa_lambda.csv", ler_mapa, criar_mapa_lambda_padrao)
+                try:
+                    st.session_state["autotune"] = autotune_log(log_path, mapa_ve, mapa_lambda_atual)
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+        if "autotune" in st.session_state:
+            tabelas, resumo = st.session_state["autotune"]
+            st.write(f"{resumo['usadas']} de {resumo['linhas']} amostras usadas "
+                     f"({resumo['transientes']} transientes, {resumo['frias']} com motor frio); "
+                     f"{resumo['celulas_com_dados']} de {resumo['celulas']} células com dados")
+            col_ve, col_conf = st.columns(2)
+            col_ve.markdown("**VE proposto**")
+            col_ve.dataframe(tabelas["ve"].round(1))
+            col_conf.markdown("**Confiança**")
+            col_conf.dataframe(tabelas["confianca"].round(2))
+            st.markdown("**Lambda proposto**")
+            st.dataframe(tabelas["lambda"].round(3))
+            if st.button("Aplicar proposta", key="btn_autotune_aplicar"):
+                for tipo in ("ve", "lambda"):
+                    tabelas[tipo].to_csv(f"mapa_{tipo}.csv")
+                    cache.invalidar(f"mapa_{tipo}.csv")
+                    enviar_mapa(tipo, tabelas[tipo])
+                del st.session_state["autotune"]
+                st.success("Mapas VE e lambda atualizados!")
+
 # --- Mapa Ignição ---
 with aba[1]:
     st.subheader("Mapa Ignição")
-    if os.path.exists("mapa_ign.csv"):
-        mapa_ign = pd.read_csv("mapa_ign.csv", index_col=0)
-    else:
-        mapa_ign = criar_mapa_ignicao_base()  # Usa mapa base ao invés de vazio
+    mapa_ign = cache.ler("mapa_ign.csv", ler_mapa, criar_mapa_ignicao_base)
     mapa_ign_editado = st.data_editor(mapa_ign, num_rows="dynamic", key="mapa_ign_editor")
     if st.button("Salvar Mapa Ignição", key="btn_salvar_ign"):
         mapa_ign_editado.to_csv("mapa_ign.csv")
+        cache.invalidar("mapa_ign.csv")
         st.success("Mapa Ignição salvo!")
 
 # --- Mapa Lambda ---
 with aba[2]:
     st.subheader("Mapa Lambda")
-    if os.path.exists("mapa_lambda.csv"):
-        mapa_lambda = pd.read_csv("mapa_lambda.csv", index_col=0)
-    else:
-        mapa_lambda = criar_mapa_lambda_base()  # Usa mapa base ao invés de vazio
-        mapa_lambda.values[:] = 1.0  # Valor padrão lambda = 1.0
+    mapa_lambda = cache.ler("mapa_lambda.csv", ler_mapa, criar_mapa_lambda_padrao)
     mapa_lambda_editado = st.data_editor(mapa_lambda, num_rows="dynamic", key="mapa_lambda_editor")
     if st.button("Salvar Mapa Lambda", key="btn_salvar_lambda"):
         mapa_lambda_editado.to_csv("mapa_lambda.csv")
+        cache.invalidar("mapa_lambda.csv")
+        enviar_mapa("lambda", mapa_lambda_editado)
         st.success("Mapa Lambda salvo!")
 
 # --- Aba Diagnóstico ---
@@ -161,7 +234,12 @@ with aba[4]:
     if "obd_reader" not in st.session_state:
         st.warning("⚠️ Conecte o OBD primeiro!")
     else:
-        mapper = ECUMapper(st.session_state.obd_reader.connection)
+        # Mantém o mapper entre execuções: guarda as imagens lidas e o índice de backups
+        if "ecu_mapper" not in st.session_state:
+            reader = st.session_state.obd_reader
+            st.session_state.ecu_mapper = ECUMapper(reader.connection,
+                                                    vin=(reader.info_veiculo or {}).get('vin'))
+        mapper = st.session_state.ecu_mapper
         
         # Seleção do tipo de mapa
         map_type = st.selectbox(
@@ -182,8 +260,8 @@ with aba[4]:
         with col2:
             if st.button("💾 Fazer Backup"):
                 try:
-                    backup_file = mapper.backup_map(map_type.lower())
-                    st.success(f"✅ Backup salvo em: {backup_file}")
+                    backup = mapper.backup_map(map_type.lower())
+                    st.success(f"✅ Backup salvo: {backup['id']}")
                 except Exception as e:
                     st.error(f"❌ Erro no backup: {e}")
         
@@ -200,24 +278,35 @@ with aba[4]:
             with col3:
                 if st.button("✍️ Gravar na ECU"):
                     try:
-                        mapper.write_map(map_type.lower(), mapa_editado)
-                        st.success("✅ Mapa gravado com sucesso!")
+                        relatorio = mapper.write_map(map_type.lower(), mapa_editado)
+                        if relatorio["erros"]:
+                            enderecos = ", ".join(f"0x{e:04X}" for e in relatorio["erros"])
+                            st.error(f"❌ Falha gravando {enderecos}")
+                        else:
+                            st.success(f"✅ Mapa gravado: {relatorio['bytes_alterados']} bytes alterados "
+                                       f"em {len(relatorio['blocos'])} blocos "
+                                       f"({relatorio['transacoes']} transações)")
                     except Exception as e:
                         st.error(f"❌ Erro gravando mapa: {e}")
                         
             with col4:
-                # Lista backups disponíveis
-                backups = os.listdir(mapper.backup_dir)
+                # Lista backups disponíveis (só o índice, sem abrir as imagens)
+                backups = {b["id"]: b for b in mapper.backups.listar(map_type.lower())}
                 backup_select = st.selectbox(
                     "Restaurar backup",
-                    backups,
+                    list(backups),
+                    format_func=lambda i: f"{backups[i]['timestamp']} · {backups[i]['vin'] or 'sem VIN'} · {backups[i]['hash'][:8]}",
                     key="backup_select"
                 )
                 
-                if st.button("🔄 Restaurar"):
+                if st.button("🔄 Restaurar") and backup_select:
                     try:
-                        # Implementar restauração
-                        st.success("✅ Mapa restaurado!")
+                        relatorio = mapper.restaurar_backup(backup_select)
+                        if relatorio["erros"]:
+                            raise IOError(f"{len(relatorio['erros'])} endereços não gravados")
+                        st.session_state.current_map = mapper.convert_to_dataframe(
+                            mapper.imagens[map_type.lower()])
+                        st.success(f"✅ Mapa restaurado! ({relatorio['bytes_alterados']} bytes alterados)")
                     except Exception as e:
                         st.error(f"❌ Erro restaurando: {e}")
 
@@ -270,138 +359,87 @@ if not os.path.exists(log_path):
     st.warning("Aguardando log_ecu_simulada.csv...")
     st.stop()
 
-placeholder = st.empty()
-
-while True:
-    if not st.session_state.rodando:
-        time.sleep(0.5)
-        continue
-
-    try:
-        df = pd.read_csv(log_path)
-        
-        # Gera timestamp único para os gráficos
-        chart_timestamp = int(time.time() * 1000)
-        
-        last_row = df.iloc[-1]
-        
-        # Formata as correções com cores
-        if 'corr_marcha' in df.columns:
-            valor = last_row['corr_marcha']
-            st.sidebar.markdown(f"Marcha Lenta: **:{'red' if valor < 1 else 'green'}[{valor:.3f}]**")
-            
-        if 'corr_lambda' in df.columns:
-            valor = last_row['corr_lambda']
-            st.sidebar.markdown(f"Lambda: **:{'red' if valor < 1 else 'green'}[{valor:.3f}]**")
-            
-        if 'corr_knock' in df.columns:
-            valor = last_row['corr_knock']
-            st.sidebar.markdown(f"Knock: **:{'red' if valor < 0 else 'green'}[{valor:.1f}°]**")
-
-        if df.empty or "timestamp" not in df:
-            st.warning("Aguardando dados válidos...")
-            time.sleep(intervalo)
-            continue
-
-        df["tempo"] = df["timestamp"] - df["timestamp"].iloc[0]
-
-        with placeholder.container():
-            st.subheader("📊 Gráficos em tempo real")
-            
-            # Mostra tamanho do DataFrame
-            st.text(f"Quantidade de amostras: {len(df)}")
-
-            # Define todas as colunas no início
-            col1, col2 = st.columns(2)
-            col3, col4 = st.columns(2)
-            col5, col6 = st.columns(2)  # col6 para manter simetria, mesmo que não use
-
-            # --- Gráfico 1: RPM / TPS ---
-            fig1 = go.Figure()
-            if 'rpm' in df.columns:
-                fig1.add_trace(go.Scatter(x=df["tempo"], y=df["rpm"], 
-                    mode='lines', name='RPM', line=dict(color='blue')))
-            if 'tps' in df.columns:
-                fig1.add_trace(go.Scatter(x=df["tempo"], y=df["tps"], 
-                    mode='lines', name='TPS (%)', line=dict(color='green')))
-            fig1.update_layout(title="RPM e TPS", height=300)
-            col1.plotly_chart(fig1, use_container_width=True, key=f"chart_rpm_tps_{chart_timestamp}")
-
-            # --- Gráfico 2: Temperatura Motor ---
-            fig2 = go.Figure()
-            if 'temp_motor' in df.columns:
-                fig2.add_trace(go.Scatter(x=df["tempo"], y=df["temp_motor"], 
-                    mode='lines', name='Temp. Motor (°C)', line=dict(color='red')))
-            fig2.update_layout(title="Temperatura Motor", height=300)
-            col2.plotly_chart(fig2, use_container_width=True, key=f"chart_temp_{chart_timestamp}")
-
-            # --- Gráfico 3: Knock e Correção de Avanço ---
-            if 'knock' in df.columns:
-                fig3 = go.Figure()
-                fig3.add_trace(go.Scatter(x=df["tempo"], y=df["knock"], 
-                    mode='lines', name='Knock', line=dict(color='red')))
-                if 'corr_knock' in df.columns:
-                    fig3.add_trace(go.Scatter(x=df["tempo"], y=df["corr_knock"], 
-                        mode='lines', name='Correção Knock (°)', line=dict(color='orange')))
-                fig3.update_layout(title="Knock e Correção", xaxis_title="Tempo (s)", height=300)
-                col3.plotly_chart(fig3, use_container_width=True, key=f"chart_knock_{chart_timestamp}")
-
-            # --- Gráfico 4: Lambda e Correção ---
-            if 'lambda' in df.columns:
-                fig4 = go.Figure()
-                fig4.add_trace(go.Scatter(x=df["tempo"], y=df["lambda"], 
-                    mode='lines', name='Lambda Real', line=dict(color='blue')))
-                if 'lambda_alvo' in df.columns:
-                    fig4.add_trace(go.Scatter(x=df["tempo"], y=df["lambda_alvo"], 
-                        mode='lines', name='Lambda Alvo', line=dict(color='green')))
-                if 'corr_lambda' in df.columns:
-                    fig4.add_trace(go.Scatter(x=df["tempo"], y=df["corr_lambda"], 
-                        mode='lines', name='Correção Lambda', line=dict(color='purple')))
-                fig4.update_layout(title="Lambda e Correção", xaxis_title="Tempo (s)", height=300)
-                col4.plotly_chart(fig4, use_container_width=True, key=f"chart_lambda_{chart_timestamp}")
-
-            # --- Gráfico 5: Correções Marcha Lenta ---
-            if 'corr_marcha' in df.columns:
-                fig5 = go.Figure()
-                fig5.add_trace(go.Scatter(x=df["tempo"], y=df["corr_marcha"], 
-                    mode='lines', name='Correção Marcha', line=dict(color='cyan')))
-                fig5.update_layout(title="Correção Marcha Lenta", xaxis_title="Tempo (s)", height=300)
-                col5.plotly_chart(fig5, use_container_width=True, key=f"chart_marcha_{chart_timestamp}")
-
-            # --- Gráfico 6: Sensores Adicionais ---
-            row3_col1, row3_col2 = st.columns(2)
-            
-            # Gráfico MAF e MAP
-            if any(x in df.columns for x in ['maf', 'map', 'boost']):
-                fig6 = go.Figure()
-                if 'maf' in df.columns:
-                    fig6.add_trace(go.Scatter(x=df["tempo"], y=df["maf"],
-                        mode='lines', name='MAF (g/s)', line=dict(color='blue')))
-                if 'map' in df.columns:
-                    fig6.add_trace(go.Scatter(x=df["tempo"], y=df["map"],
-                        mode='lines', name='MAP (kPa)', line=dict(color='red')))
-                if 'boost' in df.columns:
-                    fig6.add_trace(go.Scatter(x=df["tempo"], y=df["boost"],
-                        mode='lines', name='Boost (PSI)', line=dict(color='green')))
-                fig6.update_layout(title="Fluxo e Pressão", height=300)
-                row3_col1.plotly_chart(fig6, use_container_width=True, key=f"chart_air_{chart_timestamp}")
-            
-            # Gráfico Temperaturas
-            if any(x in df.columns for x in ['iat', 'ect', 'cat_temp']):
-                fig7 = go.Figure()
-                for sensor, cor in [('iat', 'blue'), ('ect', 'red'), ('cat_temp', 'orange')]:
-                    if sensor in df.columns:
-                        fig7.add_trace(go.Scatter(x=df["tempo"], y=df[sensor],
-                            mode='lines', name=f'Temp. {sensor.upper()}', line=dict(color=cor)))
-                fig7.update_layout(title="Temperaturas", height=300)
-                row3_col2.plotly_chart(fig7, use_container_width=True, key=f"chart_temps_{chart_timestamp}")
-
-            # Adiciona área para códigos de erro se existirem
-            if 'dtc_count' in df.columns and df['dtc_count'].iloc[-1] > 0:
-                st.error(f"⚠️ {df['dtc_count'].iloc[-1]} códigos de erro detectados!")
-
-        time.sleep(intervalo)
-
-    except Exception as e:
-        st.error(f"Erro: {e}")
-        time.sleep(1)
\ No newline at end of file
+# Gráficos vivos: a figura fica no navegador e cada tick manda só os pontos novos
+GRAFICOS = [
+    # (chave, título, [(coluna, nome, cor)], título do eixo x)
+    ("rpm_tps", "RPM e TPS", [("rpm", "RPM", "blue"), ("tps", "TPS (%)", "green")], None),
+    ("temp", "Temperatura Motor", [("temp_motor", "Temp. Motor (°C)", "red")], None),
+    ("knock", "Knock e Correção", [("knock", "Knock", "red"),
+                                  ("corr_knock", "Correção Knock (°)", "orange")], "Tempo (s)"),
+    ("lambda", "Lambda e Correção", [("lambda", "Lambda Real", "blue"),
+                                    ("lambda_alvo", "Lambda Alvo", "green"),
+                                    ("corr_lambda", "Correção Lambda", "purple")], "Tempo (s)"),
+    ("marcha", "Correção Marcha Lenta", [("corr_marcha", "Correção Marcha", "cyan")], "Tempo (s)"),
+    ("air", "Fluxo e Pressão", [("maf", "MAF (g/s)", "blue"), ("map", "MAP (kPa)", "red"),
+                                ("boost", "Boost (PSI)", "green")], None),
+    ("temps", "Temperaturas", [(sensor, f"Temp. {sensor.upper()}", cor) for sensor, cor in
+                               [("iat", "blue"), ("ect", "red"), ("cat_temp", "orange")]], None),
+]
+if "graficos_vivos" not in st.session_state:
+    st.session_state.graficos_vivos = [
+        GraficoVivo(f"grafico_{chave}", titulo, tracos, titulo_x=titulo_x)
+        for chave, titulo, tracos, titulo_x in GRAFICOS]
+
+def cor_correcao(valor, limite):
+    return f"**:{'red' if valor < limite else 'green'}[{valor:.3f}]**"
+
+@st.fragment(run_every=intervalo)
+def monitor_tempo_real():
+    # Pausado: redesenha com os dados que já tem (sem ler o log)
+    df = tailer.ler() if st.session_state.rodando else tailer.df
+    if df.empty or "timestamp" not in df:
+        st.warning("Aguardando dados válidos...")
+        return
+    if "tempo" not in df.columns:
+        df = df.assign(tempo=df["timestamp"] - df["timestamp"].iloc[0])  # Sem alterar o df do leitor
+
+    # Valores atuais do anel em memória (taxa do ciclo); sem simulador, a última linha do log
+    leitor = telemetria_ao_vivo()
+    ao_vivo = leitor.ultimo() if leitor else None
+    last_row = ao_vivo if ao_vivo else df.iloc[-1]
+
+    if ao_vivo:
+        st.subheader("⚡ Ao vivo")
+        vivo = st.columns(5)
+        vivo[0].metric("RPM", f"{ao_vivo['rpm']:.0f}")
+        vivo[1].metric("MAP", f"{ao_vivo['map_kpa']:.0f} kPa")
+        vivo[2].metric("Lambda", f"{ao_vivo['lambda']:.3f}", f"{ao_vivo['lambda'] - ao_vivo['lambda_alvo']:+.3f}")
+        vivo[3].metric("Injeção", f"{ao_vivo['inj_ms']:.2f} ms")
+        vivo[4].metric("VE", f"{ao_vivo['ve']:.1f}%")
+
+    # Correções em malha fechada, com cores
+    correcoes = [(nome, coluna, limite) for nome, coluna, limite in
+                 [("Marcha Lenta", "corr_marcha", 1), ("Lambda", "corr_lambda", 1), ("Knock", "corr_knock", 0)]
+                 if coluna in df.columns]
+    if correcoes:
+        st.markdown(" · ".join(f"{nome}: {cor_correcao(last_row[coluna], limite)}"
+                               for nome, coluna, limite in correcoes))
+
+    st.subheader("📊 Gráficos em tempo real")
+    st.text(f"Quantidade de amostras: {len(df)}")
+
+    # Mesma grade de antes: 2 colunas; zoom vira a faixa do eixo x no navegador
+    graficos = st.session_state.graficos_vivos
+    for i in range(0, len(graficos), 2):
+        for coluna, grafico in zip(st.columns(2), graficos[i:i + 2]):
+            with coluna:
+                grafico.atualizar(df, pontos_por_traco, metodo_reducao, zoom_segundos)
+
+    # Adiciona área para códigos de erro se existirem
+    if 'dtc_count' in df.columns and df['dtc_count'].iloc[-1] > 0:
+        st.error(f"⚠️ {df['dtc_count'].iloc[-1]} códigos de erro detectados!")
+
+    # Tempos por etapa do loop do simulador (metricas_ecu.json)
+    metricas = carregar_metricas()
+    if metricas:
+        with st.expander("⏱️ Desempenho do loop"):
+            st.text(f"Ticks: {metricas['ticks']} · Estouros do intervalo: {metricas['overruns']} "
+                    f"(pior: {metricas['pior_overrun_ms']:.1f} ms)")
+            if metricas.get('contadores'):
+                st.text(" · ".join(f"{k}: {v}" for k, v in metricas['contadores'].items()))
+            st.dataframe(pd.DataFrame(metricas['etapas']).T.round(3))
+            if metricas.get('filas'):
+                st.caption("Filas do pipeline")
+                st.dataframe(pd.DataFrame(metricas['filas']).T.round(2))
+
+monitor_tempo_real()
@@ -1,13 +1,13 @@
 def decode_wideband(messages):
     """Decodifica sensor wideband O2"""
-    d = messages[0].data
+    d = messages[0].data[2:]  # Pula modo e PID
     return (d[0] * 256 + d[1]) / 32768
 
 def decode_boost(messages):
     """Decodifica pressão do boost"""
-    d = messages[0].data
+    d = messages[0].data[2:]
     return (d[0] - 128) * 0.01
 
 def decode_percent(messages):
     """Decodifica valores percentuais"""
-    return messages[0].data[0] * 100.0 / 255.0
+    return messages[0].data[2] * 100.0 / 255.0
@@ -0,0 +1,47 @@
+import asyncio
+
+FIM = None  # Marca de fim de fluxo, repassada de etapa em etapa
+
+class FilaAmostras(asyncio.Queue):
+    """Fila limitada entre duas etapas do pipeline, com profundidade medida.
+
+    Cheia, `colocar()` descarta a amostra mais antiga (`descartar_antigas`:
+    para quem só se interessa pelo estado mais recente) ou espera espaço
+    (backpressure: o produtor desacelera até o consumidor alcançar). Com
+    `desvio` (corrotina), a amostra descartada é entregue a ele em vez de sumir.
+    """
+    def __init__(self, capacidade, descartar_antigas=True, desvio=None):
+        super().__init__(capacidade)
+        self.descartar_antigas = descartar_antigas
+        self.desvio = desvio
+        self.descartadas = 0
+        self.bloqueios = 0  # Vezes em que o produtor esperou espaço
+        self.profundidade_max = 0
+        self._soma_profundidade = 0
+        self._medicoes = 0
+
+    async def colocar(self, amostra):
+        if self.full():
+            if self.descartar_antigas:
+                descartada = self.get_nowait()
+                self.descartadas += 1
+                if self.desvio is not None:
+                    await self.desvio(descartada)
+            else:
+                self.bloqueios += 1
+        await self.put(amostra)
+        profundidade = self.qsize()
+        self._soma_profundidade += profundidade
+        self._medicoes += 1
+        if profundidade > self.profundidade_max:
+            self.profundidade_max = profundidade
+
+    def resumo(self):
+        return {
+            "capacidade": self.maxsize,
+            "profundidade": self.qsize(),
+            "profundidade_media": self._soma_profundidade / self._medicoes if self._medicoes else 0.0,
+            "profundidade_max": self.profundidade_max,
+            "descartadas": self.descartadas,
+            "bloqueios": self.bloqueios,
+        }
@@ -0,0 +1,215 @@
+import argparse
+import math
+import os
+import time
+import numpy as np
+import pandas as pd
+from config_motor import CONFIG_MOTOR
+from controle_malha_fechada import CORRECOES, GerenciadorControle, GerenciadorControleBanco
+
+ENTRADAS_PADRAO = {"lambda_alvo": 1.0, "knock": 0.0}
+
+def _numerico(serie):
+    """Coluna numérica; aceita valores com unidade de sessões OBD (ex.: "850.0 revolutions_per_minute")"""
+    if serie.dtype == object:
+        serie = serie.astype(str).str.extract(r"^\s*(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)")[0]
+    return pd.to_numeric(serie, errors="coerce").to_numpy(dtype=float)
+
+COLUNAS_LAMBDA = ("lambda", "wideband", "afr")  # Em ordem de preferência
+
+def lambda_medido(df):
+    """Lambda medido de 'lambda', do PID customizado 'wideband' (sessões OBD) ou de 'afr'; None se não há"""
+    if "lambda" in df.columns:
+        return _numerico(df["lambda"])
+    if "wideband" in df.columns:
+        return _numerico(df["wideband"])
+    if "afr" in df.columns:
+        return _numerico(df["afr"]) / CONFIG_MOTOR["injetor"].get("afr_estequiometrico", 14.7)
+    return None
+
+def entradas_controle(df):
+    """Arrays de entrada da malha fechada a partir de um log e os nomes das que foram supridas.
+
+    Lambda vem de `lambda_medido`; lambda_alvo e knock ausentes assumem os
+    valores de ENTRADAS_PADRAO.
+    """
+    for obrigatoria in ("timestamp", "rpm"):
+        if obrigatoria not in df.columns:
+            raise ValueError(f"Log sem a coluna '{obrigatoria}'")
+    entradas = {"timestamp": _numerico(df["timestamp"]), "rpm": _numerico(df["rpm"])}
+    supridas = []
+    entradas["lambda"] = lambda_medido(df)
+    if entradas["lambda"] is None:
+        entradas["lambda"] = np.full(len(df), 1.0)
+        supridas.append("lambda")
+    for nome, padrao in ENTRADAS_PADRAO.items():
+        if nome in df.columns:
+            entradas[nome] = _numerico(df[nome])
+        else:
+            entradas[nome] = np.full(len(df), padrao)
+            supridas.append(nome)
+    return entradas, supridas
+
+def reproduzir(df, gerenciador=None):
+    """Passa as linhas do log pela malha fechada, com o dt dos timestamps gravados.
+
+    Retorna ({correção: array}, resumo). Linhas com timestamp que não avança
+    (repetido, fora de ordem ou vazio) não entram no controle e ficam NaN.
+    """
+    gerenciador = gerenciador or GerenciadorControle()
+    entradas, supridas = entradas_controle(df)
+    n = len(df)
+    tempos = entradas["timestamp"].tolist()
+    rpm = entradas["rpm"].tolist()
+    lambdas = entradas["lambda"].tolist()
+    alvos = entradas["lambda_alvo"].tolist()
+    knocks = entradas["knock"].tolist()
+    saidas = {c: [math.nan] * n for c in CORRECOES}
+
+    inicio = time.perf_counter()
+    dados = {}  # Reaproveitado: atualizar() só lê
+    ultimo = -math.inf
+    ignoradas = 0
+    for i in range(n):
+        t = tempos[i]
+        if not t > ultimo:
+            ignoradas += 1
+            continue
+        ultimo = t
+        dados["timestamp"] = t
+        dados["rpm"] = rpm[i]
+        dados["lambda"] = lambdas[i]
+        dados["lambda_alvo"] = alvos[i]
+        dados["knock"] = knocks[i]
+        for nome, valor in gerenciador.atualizar(dados).items():
+            saidas[nome][i] = valor
+    segundos = time.perf_counter() - inicio
+
+    resumo = {
+        "linhas": n,
+        "ignoradas": ignoradas,
+        "segundos": segundos,
+        "linhas_por_s": n / segundos if segundos > 0 else 0.0,
+        "entradas_supridas": supridas,
+        "duracao_log_s": float(ultimo - tempos[0]) if n and ultimo > -math.inf else 0.0,
+    }
+    return {c: np.array(v) for c, v in saidas.items()}, resumo
+
+def reproduzir_lote(dfs, gerenciador=None):
+    """Vários logs de uma vez, uma malha por log num GerenciadorControleBanco.
+
+    Mesmo resultado de `reproduzir` em cada log (inclusive as linhas
+    ignoradas), mas o passo de todos os logs é uma operação de array.
+    Retorna uma lista de ({correção: array}, resumo), na ordem dos logs.
+    """
+    entradas = [entradas_controle(df) for df in dfs]
+    n, v = max((len(df) for df in dfs), default=0), len(dfs)
+    gerenciador = gerenciador or GerenciadorControleBanco(v)
+
+    # Logs mais curtos são completados com NaN (a malha daquela posição só espera)
+    matriz = {nome: np.full((n, v), math.nan) for nome in ("timestamp", "rpm", "lambda", "lambda_alvo", "knock")}
+    for j, (colunas, _) in enumerate(entradas):
+        for nome, valores in colunas.items():
+            matriz[nome][:len(valores), j] = valores
+    saidas = {c: np.empty((n, v)) for c in CORRECOES}
+
+    inicio = time.perf_counter()
+    for k in range(n):
+        passo = gerenciador.atualizar({nome: valores[k] for nome, valores in matriz.items()})
+        for nome in CORRECOES:
+            saidas[nome][k] = passo[nome]
+    segundos = time.perf_counter() - inicio
+
+    resultados = []
+    for j, df in enumerate(dfs):
+        tempos = matriz["timestamp"][:len(df), j]
+        # Maior timestamp válido antes de cada linha (NaN não avança, como em `reproduzir`)
+        validos = np.where(np.isnan(tempos), -math.inf, tempos)
+        anterior = np.concatenate(([-math.inf], np.maximum.accumulate(validos)[:-1]))
+        ultimo = np.nanmax(tempos) if len(df) and not np.isnan(tempos).all() else math.nan
+        resultados.append(({c: saidas[c][:len(df), j].copy() for c in CORRECOES}, {
+            "linhas": len(df),
+            "ignoradas": int(np.sum(~(tempos > anterior))),
+            "segundos": segundos,
+            "linhas_por_s": sum(len(d) for d in dfs) / segundos if segundos > 0 else 0.0,
+            "entradas_supridas": entradas[j][1],
+            "duracao_log_s": float(ultimo - tempos[0]) if not math.isnan(ultimo) else 0.0,
+        }))
+    return resultados
+
+def comparar_correcoes(df, recalculadas):
+    """Diferença entre as correções gravadas no log e as recalculadas"""
+    diferencas = {}
+    for nome, valores in recalculadas.items():
+        if nome not in df.columns:
+            continue
+        delta = np.abs(_numerico(df[nome]) - valores)
+        validos = delta[~np.isnan(delta)]
+        diferencas[nome] = {
+            "max_abs": float(validos.max()) if len(validos) else 0.0,
+            "rms": float(np.sqrt(np.mean(validos ** 2))) if len(validos) else 0.0,
+            "linhas": int(len(validos)),
+        }
+    return diferencas
+
+def reproduzir_log(caminho="log_ecu_simulada.csv", saida=None, gerenciador=None):
+    """Reproduz um log pela malha fechada e grava as correções recalculadas ao lado das originais.
+
+    As novas colunas são `<correção>_replay`; sem `saida`, o arquivo vai para
+    `<log>_replay.csv`. `saida=False` não grava nada.
+    """
+    df = pd.read_csv(caminho)
+    recalculadas, resumo = reproduzir(df, gerenciador)
+    resumo["diferencas"] = comparar_correcoes(df, recalculadas)
+    for nome, valores in recalculadas.items():
+        df[f"{nome}_replay"] = valores
+    if saida is None:
+        raiz, ext = os.path.splitext(caminho)
+        saida = f"{raiz}_replay{ext or '.csv'}"
+    if saida:
+        df.to_csv(saida, index=False)
+        resumo["saida"] = saida
+    return df, resumo
+
+def reproduzir_logs(caminhos, sufixo="_replay", gravar=True):
+    """reproduzir_log para vários logs, com as malhas rodando juntas (reproduzir_lote)"""
+    dfs = [pd.read_csv(caminho) for caminho in caminhos]
+    resultados = []
+    for caminho, df, (recalculadas, resumo) in zip(caminhos, dfs, reproduzir_lote(dfs)):
+        resumo["diferencas"] = comparar_correcoes(df, recalculadas)
+        for nome, valores in recalculadas.items():
+            df[f"{nome}_replay"] = valores
+        if gravar:
+            raiz, ext = os.path.splitext(caminho)
+            resumo["saida"] = f"{raiz}{sufixo}{ext or '.csv'}"
+            df.to_csv(resumo["saida"], index=False)
+        resultados.append((df, resumo))
+    return resultados
+
+def _imprimir_resumo(resumo):
+    print(f"{resumo['linhas']} linhas ({resumo['duracao_log_s']:.0f} s de log) em "
+          f"{resumo['segundos']:.2f} s ({resumo['linhas_por_s']:,.0f} linhas/s)")
+    if resumo["ignoradas"]:
+        print(f"Linhas ignoradas (timestamp sem avanço): {resumo['ignoradas']}")
+    if resumo["entradas_supridas"]:
+        print(f"Entradas ausentes no log, com valor padrão: {', '.join(resumo['entradas_supridas'])}")
+    for nome, d in resumo["diferencas"].items():
+        print(f"{nome}: diferença máx {d['max_abs']:.6g}, RMS {d['rms']:.6g} ({d['linhas']} linhas)")
+    if "saida" in resumo:
+        print(f"Gravado em {resumo['saida']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reproduz um log pela malha fechada")
+    parser.add_argument("logs", nargs="*", default=["log_ecu_simulada.csv"],
+                        help="Um ou mais logs (vários rodam juntos num banco de controladores)")
+    parser.add_argument("--saida", help="CSV de saída para um único log (padrão: <log>_replay.csv)")
+    parser.add_argument("--sem-saida", action="store_true", help="Só compara, sem gravar")
+    args = parser.parse_args()
+
+    if len(args.logs) == 1:
+        _, resumo = reproduzir_log(args.logs[0], False if args.sem_saida else args.saida)
+        _imprimir_resumo(resumo)
+    else:
+        for caminho, (_, resumo) in zip(args.logs, reproduzir_logs(args.logs, gravar=not args.sem_saida)):
+            print(f"\n{caminho}")
+            _imprimir_resumo(resumo)
@@ -1,7 +1,9 @@
 import numpy as np
 
 class SensorManager:
-    def __init__(self):
+    def __init__(self, seed=None):
+        # Gerador próprio quando há seed, para simulações reproduzíveis
+        self.rng = np.random if seed is None else np.random.RandomState(seed)
         self.sensors = {
             'rpm': 800,
             'tps': 0,
@@ -21,7 +23,7 @@ class SensorManager:
         
         # RPM baseado no TPS
         if self.sensors['tps'] < 5:
-            self.sensors['rpm'] = 800 + np.random.normal(0, 50)
+            self.sensors['rpm'] = 800 + self.rng.normal(0, 50)
         else:
             rpm_delta = (self.sensors['tps'] / 100.0) * 500
             self.sensors['rpm'] = min(7000, self.sensors['rpm'] + rpm_delta)
@@ -29,7 +31,94 @@ class SensorManager:
         # Outros sensores
         self.sensors['ect'] = min(90, self.sensors['ect'] + 0.1)
         self.sensors['map_kpa'] = 90 + (self.sensors['tps'] * 0.5)
-        self.sensors['lambda'] += np.random.normal(0, 0.02)
+        self.sensors['lambda'] += self.rng.normal(0, 0.02)
         self.sensors['lambda'] = max(0.7, min(1.3, self.sensors['lambda']))
         
         return self.sensors
+
+    def read_all_batch(self, tempos):
+        """Simula a trajetória inteira de uma vez, em arrays NumPy.
+
+        Dá o mesmo resultado que chamar read_all para cada tempo em sequência
+        (mesma seed, mesma ordem de sorteios) e deixa o estado no último passo.
+        """
+        t = np.asarray(tempos, dtype=float)
+        n = len(t)
+
+        tps = np.clip(50 + 40 * np.sin(0.7 * t), 0, 100)
+        marcha_lenta = tps < 5
+
+        # Sorteios na mesma ordem do passo a passo: [ruído rpm se lenta], ruído lambda
+        por_passo = 1 + marcha_lenta
+        offsets = np.cumsum(por_passo) - por_passo
+        z = self.rng.normal(0, 1, int(por_passo.sum()))
+        ruido_rpm = 50 * z[offsets[marcha_lenta]]
+        ruido_lambda = 0.02 * z[offsets + marcha_lenta]
+
+        # RPM: acumula o delta entre reinícios em marcha lenta. Os deltas são
+        # positivos, então saturar no fim equivale a saturar a cada passo.
+        rpm_delta = (tps / 100.0) * 500
+        rpm = np.empty(n)
+        base = self.sensors['rpm']
+        inicio = 0
+        for k, ruido in zip(np.flatnonzero(marcha_lenta).tolist() + [n], ruido_rpm.tolist() + [None]):
+            if k > inicio:
+                rpm[inicio:k] = np.minimum(7000, _acumular(base, rpm_delta[inicio:k]))
+            if k < n:
+                rpm[k] = base = 800 + ruido
+                inicio = k + 1
+
+        ect = np.minimum(90, _acumular(self.sensors['ect'], np.full(n, 0.1)))
+        map_kpa = 90 + (tps * 0.5)
+        lambda_ = _passeio_saturado(self.sensors['lambda'], ruido_lambda, 0.7, 1.3)
+
+        dados = {
+            'rpm': rpm,
+            'tps': tps,
+            'map_kpa': map_kpa,
+            'iat': np.full(n, self.sensors['iat']),
+            'ect': ect,
+            'lambda': lambda_,
+            'knock': np.full(n, self.sensors['knock']),
+            'bat': np.full(n, self.sensors['bat']),
+            've': np.full(n, self.sensors['ve']),
+        }
+        if n:
+            self.sensors.update({k: v[-1] for k, v in dados.items()})
+        return dados
+
+def _acumular(inicial, incrementos):
+    """Soma acumulada sequencial (mesmo arredondamento que somar passo a passo)"""
+    return np.cumsum(np.concatenate(([inicial], incrementos)))[1:]
+
+def _passeio_saturado(inicial, ruido, minimo, maximo):
+    """Passeio aleatório saturado, exato: acumula em blocos até sair da faixa"""
+    n = len(ruido)
+    saida = np.empty(n)
+    atual = inicial
+    i = 0
+    bloco = 64
+    while i < n:
+        parcial = _acumular(atual, ruido[i:i + bloco])
+        fora = np.flatnonzero((parcial < minimo) | (parcial > maximo))
+        if len(fora) == 0:
+            saida[i:i + len(parcial)] = parcial
+            atual = parcial[-1]
+            i += len(parcial)
+            bloco = min(bloco * 2, 65536)
+            continue
+
+        j = fora[0]
+        saida[i:i + j] = parcial[:j]
+        if j:
+            atual = parcial[j - 1]
+        i += j
+
+        # Perto do limite a saturação se repete: avança passo a passo
+        fim = min(n, i + 32)
+        for k, e in enumerate(ruido[i:fim].tolist(), start=i):
+            atual = max(minimo, min(maximo, atual + e))
+            saida[k] = atual
+        i = fim
+        bloco = 64
+    return saida
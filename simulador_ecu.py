@@ -1,70 +1,221 @@
-import time
+import asyncio
+import math
+import os
+import numpy as np
 import pandas as pd
 from config_motor import CONFIG_MOTOR
 from ecu_core import ECU
-from controle_malha_fechada import GerenciadorControle
+from controle_malha_fechada import CORRECOES, GerenciadorControle
 from obd_reader import OBDReader
+from log_writer import LogWriter
+from metricas_loop import MetricasLoop
+from agendador_ciclo import AgendadorCiclo
+from canal_controle import CanalControle, PORTA_CONTROLE, mapa_do_comando
+from pipeline_aquisicao import FilaAmostras, FIM
+from telemetria_shm import PublicadorTelemetria
 
-def simular_ecu(duracao_segundos=60, intervalo=0.5, usar_obd=False):
+def _carregar_mapas_salvos(ecu):
+    """Mapas VE/lambda salvos pelo painel, se existirem"""
+    mapas = {chave: pd.read_csv(arquivo, index_col=0)
+             for chave, arquivo in (("mapa_ve", "mapa_ve.csv"), ("mapa_lambda", "mapa_lambda.csv"))
+             if os.path.exists(arquivo)}
+    ecu.carregar_mapas(**mapas)
+
+def _aplicar_comando(comando, ecu, agendador, metricas):
+    """Aplica um comando do painel; retorna True/False para pausar/retomar, None nos demais"""
+    cmd = comando["cmd"]
+    if cmd in ("pausar", "retomar"):
+        return cmd == "pausar"
+    if cmd == "intervalo":
+        # Qualquer processo local pode mandar comandos: período inválido fica o atual
+        try:
+            periodo = float(comando["valor"])
+            if not math.isfinite(periodo):
+                raise ValueError(f"Período inválido: {periodo}")
+            agendador.alterar_periodo(periodo)
+        except (ValueError, TypeError, KeyError) as e:
+            print(f"Intervalo rejeitado, mantendo {agendador.periodo} s: {e}")
+        metricas.intervalo = agendador.periodo
+    elif cmd == "mapa" and comando.get("tipo") in ("ve", "lambda"):
+        # Mapa vindo de um editor com linhas livres: inválido, fica o anterior
+        try:
+            ecu.carregar_mapas(**{f"mapa_{comando['tipo']}": mapa_do_comando(comando)})
+        except (ValueError, TypeError, KeyError) as e:
+            print(f"Mapa {comando['tipo']} rejeitado, mantendo o anterior: {e}")
+    return None
+
+async def _aquisicao(ecu, obd_reader, agendador, metricas, canal, saida, duracao_segundos):
+    """Etapa 1: lê os dados no prazo de cada ciclo e entrega à fila do controle"""
+    pausado = False
+    while True:
+        t = metricas.inicio()
+        t_corrente = await agendador.esperar_async()
+        if t_corrente >= duracao_segundos:
+            break
+        inicio_tick = t = metricas.registrar("espera", t)
+        metricas.registrar_duracao("atraso_despertar", agendador.ultimo_atraso * 1e9)
+        
+        # Comandos do painel; em pausa, espera o próximo sem ocupar o event loop
+        if canal:
+            espera = 0.0
+            while True:
+                comandos = await asyncio.to_thread(canal.receber, espera) if espera else canal.receber()
+                for comando in comandos:
+                    estado = _aplicar_comando(comando, ecu, agendador, metricas)
+                    if estado is not None:
+                        pausado = estado
+                if not pausado:
+                    break
+                espera = 0.5
+            if espera:
+                agendador.reancorar()  # Volta da pausa sem ciclos atrasados
+                inicio_tick = t = metricas.inicio()
+            t = metricas.registrar("canal_controle", t)
+        
+        # Lê dados reais ou simulados; a serial roda numa thread para não travar as outras etapas
+        if obd_reader:
+            dados_ecu = await asyncio.to_thread(obd_reader.read_all_advanced)
+            t = metricas.registrar("obd_read_all", t)
+        else:
+            dados_ecu = ecu.cycle(t_corrente)
+            t = metricas.registrar("ecu_cycle", t)
+        
+        await saida.colocar((inicio_tick, dados_ecu))
+        metricas.contadores["prazos_perdidos"] = agendador.perdidos
+        metricas.contadores["ciclos_pulados"] = agendador.pulados
+        metricas.fim_tick(inicio_tick)
+    await saida.colocar(FIM)
+
+async def _controle(controle, metricas, entrada, saida):
+    """Etapa 2: correções em malha fechada sobre a amostra mais recente; repassa ao log"""
+    while (amostra := await entrada.get()) is not FIM:
+        inicio_tick, dados_ecu = amostra
+        t = metricas.inicio()
+        corrigida = {**dados_ecu, **controle.atualizar(dados_ecu)}
+        metricas.registrar("controle", t)
+        await saida.colocar((inicio_tick, corrigida))
+    await saida.colocar(FIM)
+
+async def _registro(log, telemetria, metricas, entrada):
+    """Etapa 3: publica cada amostra controlada na telemetria e grava no log"""
+    while (amostra := await entrada.get()) is not FIM:
+        inicio_tick, dados_ecu = amostra
+        t = metricas.inicio()
+        if telemetria:
+            telemetria.publicar(dados_ecu)
+            t = metricas.registrar("telemetria", t)
+        log.escrever(dados_ecu)
+        t = metricas.registrar("log", t)
+        metricas.registrar_duracao("latencia_amostra", t - inicio_tick)
+
+async def _executar_pipeline(ecu, obd_reader, controle, log, telemetria, agendador, metricas,
+                             canal, duracao_segundos, fila_controle, fila_log):
+    # Controle só quer o estado atual: amostras velhas são descartadas e a
+    # aquisição nunca espera por ele. O log não perde nenhuma: as descartadas
+    # seguem direto para ele (na ordem, antes das mais novas) com as correções
+    # em NaN, e cheio ele segura quem produz.
+    log_fila = FilaAmostras(fila_log, descartar_antigas=False)
+    sem_correcao = dict.fromkeys(CORRECOES, math.nan)
+
+    async def registrar_descartada(amostra):
+        inicio_tick, dados_ecu = amostra
+        await log_fila.colocar((inicio_tick, {**dados_ecu, **sem_correcao}))
+
+    filas = {
+        "controle": FilaAmostras(fila_controle, descartar_antigas=True, desvio=registrar_descartada),
+        "log": log_fila,
+    }
+    metricas.filas.update(filas)
+    await asyncio.gather(
+        _aquisicao(ecu, obd_reader, agendador, metricas, canal, filas["controle"], duracao_segundos),
+        _controle(controle, metricas, filas["controle"], filas["log"]),
+        _registro(log, telemetria, metricas, filas["log"]),
+    )
+
+def simular_ecu(duracao_segundos=60, intervalo=0.5, usar_obd=False,
+                log_path="log_ecu_simulada.csv", flush_linhas=20, flush_segundos=1.0,
+                porta_obd=None, instrumentar=True, metricas_path="metricas_ecu.json",
+                politica_atraso="pular", porta_controle=PORTA_CONTROLE,
+                fila_controle=4, fila_log=256, telemetria_nome="ecu_telemetria"):
+    """Pipeline assíncrono aquisição -> controle -> log, ligado por filas limitadas"""
     ecu = ECU(CONFIG_MOTOR)
+    _carregar_mapas_salvos(ecu)
     controle = GerenciadorControle()
-    registros = []
-    t_inicio = time.time()
     
     # Inicializa OBD se necessário
     obd_reader = None
     if usar_obd:
         try:
             # Tenta conexão Bluetooth primeiro
-            obd_reader = OBDReader(bluetooth=True)
+            obd_reader = OBDReader(porta_obd, bluetooth=True)
             try:
                 obd_reader.connect()
             except ConnectionError:
                 print("Tentando conexão USB...")
-                obd_reader = OBDReader(bluetooth=False)
+                obd_reader = OBDReader(porta_obd, bluetooth=False)
                 obd_reader.connect()
             
             # Adiciona PIDs customizados se suportados
             supported = obd_reader.get_supported_commands()
             print(f"Comandos suportados: {supported}")
             
-            # Inicia leitura contínua dos comandos principais
-            main_commands = [obd_reader.commands[x] for x in ['rpm', 'speed', 'throttle']]
-            obd_reader.start_continuous(main_commands)
-            
         except Exception as e:
             print(f"Erro ao conectar OBD: {e}")
             return
     
-    while (time.time() - t_inicio) < duracao_segundos:
-        # Verifica pause
+    # Tempo de cada etapa do tick (histogramas gravados em metricas_path)
+    metricas = MetricasLoop(metricas_path, intervalo, ativo=instrumentar)
+    
+    # Ciclos em prazos fixos: o tempo da simulação é o nominal (k * intervalo)
+    agendador = AgendadorCiclo(intervalo, politica_atraso)
+    
+    # Comandos do painel (pausa, intervalo, mapas) por UDP local
+    canal = None
+    if porta_controle:
         try:
-            with open("controle_simulacao.txt", "r") as f:
-                if f.read().strip() == "PAUSE":
-                    time.sleep(0.1)
-                    continue
-        except FileNotFoundError:
-            pass
-            
-        t_corrente = time.time() - t_inicio
-        
-        # Lê dados reais ou simulados
-        if usar_obd and obd_reader:
-            dados_ecu = obd_reader.read_all_advanced()
-        else:
-            dados_ecu = ecu.cycle(t_corrente)
-        
-        # Aplica controles em malha fechada
-        correcoes = controle.atualizar(dados_ecu)
-        dados_ecu.update(correcoes)
-        
-        registros.append(dados_ecu)
-        
-        # Salva log
-        df = pd.DataFrame(registros)
-        df.to_csv("log_ecu_simulada.csv", index=False)
-        
-        time.sleep(intervalo)
+            canal = CanalControle(porta_controle)
+        except OSError as e:
+            print(f"Canal de controle indisponível na porta {porta_controle}: {e}")
+    
+    # Últimos registros em memória compartilhada para o painel (sem disco)
+    telemetria = None
+    if telemetria_nome:
+        try:
+            telemetria = PublicadorTelemetria(telemetria_nome)
+        except OSError as e:
+            print(f"Telemetria em memória compartilhada indisponível: {e}")
+    
+    # Log em modo append: grava só as linhas novas a cada flush
+    try:
+        with LogWriter(log_path, max_linhas=flush_linhas, max_intervalo=flush_segundos) as log:
+            asyncio.run(_executar_pipeline(ecu, obd_reader, controle, log, telemetria, agendador,
+                                           metricas, canal, duracao_segundos, fila_controle, fila_log))
+    finally:
+        metricas.gravar()
+        if canal:
+            canal.close()
+        if telemetria:
+            telemetria.close()
+    resumo = agendador.resumo()
+    if resumo["prazos_perdidos"]:
+        print(f"Prazos perdidos: {resumo['prazos_perdidos']} de {resumo['ciclos']} ciclos "
+              f"({resumo['ciclos_pulados']} pulados, maior atraso {resumo['maior_atraso_ms']:.1f} ms)")
+    descartadas = metricas.filas["controle"].descartadas if metricas.filas else 0
+    if descartadas:
+        print(f"Amostras descartadas antes do controle: {descartadas}")
+
+    if obd_reader:
+        print(f"Taxa OBD: {obd_reader.amostras_por_segundo:.1f} amostras/s")
+
+def simular_ecu_lote(duracao_segundos=3600, intervalo=0.5, seed=0,
+                     log_path="log_ecu_simulada.csv"):
+    """Gera o log de uma simulação inteira sem esperar o relógio (modo lote)"""
+    ecu = ECU(CONFIG_MOTOR, seed=seed)
+    tempos = np.arange(0, duracao_segundos, intervalo)
+    df = pd.DataFrame(ecu.cycle_batch(tempos))
+    if log_path:
+        df.to_csv(log_path, index=False)
+    return df
 
 if __name__ == "__main__":
     print("Iniciando ECU...")
@@ -0,0 +1,149 @@
+import math
+import sys
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory, resource_tracker
+
+NOME_TELEMETRIA = "ecu_telemetria"
+CAPACIDADE_PADRAO = 4096  # Registros no anel (~35 min a 0.5 s)
+
+# Layout fixo de cada registro (float64; campo ausente = NaN)
+CAMPOS_TELEMETRIA = (
+    "timestamp", "rpm", "tps", "map_kpa", "iat", "ect", "lambda", "knock", "bat",
+    "ve", "lambda_alvo", "inj_ms", "corr_marcha", "corr_lambda", "corr_knock",
+)
+
+# Cabeçalho: versão do layout, capacidade, nº de campos e total de registros escritos
+CABECALHO = np.dtype([("versao", "<u4"), ("capacidade", "<u4"), ("n_campos", "<u4"),
+                      ("_reservado", "<u4"), ("escritos", "<u8")])
+VERSAO_LAYOUT = 1
+
+_publicados = set()  # Anéis criados neste processo (registrados no resource_tracker)
+
+def _dtype_registro(n_campos):
+    # seq do seqlock: ímpar durante a escrita, 2*(índice+1) quando o registro n = índice está completo
+    return np.dtype([("seq", "<u8"), ("valores", "<f8", (n_campos,))])
+
+def _numero(valor):
+    valor = getattr(valor, "magnitude", valor)  # Quantidades do python-OBD
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return math.nan
+
+class _Anel:
+    """Visões numpy (sem cópia) sobre o bloco de memória compartilhada"""
+    def _mapear(self, shm):
+        self.shm = shm
+        self.cabecalho = np.ndarray((), CABECALHO, buffer=shm.buf)
+        self.capacidade = int(self.cabecalho["capacidade"])
+        self.registros = np.ndarray((self.capacidade,), _dtype_registro(int(self.cabecalho["n_campos"])),
+                                    buffer=shm.buf, offset=CABECALHO.itemsize)
+
+    def close(self):
+        # As visões precisam sumir antes do close (senão o buffer continua exportado)
+        self.cabecalho = self.registros = None
+        self.shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class PublicadorTelemetria(_Anel):
+    """Lado do simulador: publica cada registro no anel (um só escritor).
+
+    Cada registro tem seu contador de sequência (seqlock): fica ímpar durante
+    a escrita e o total de registros no cabeçalho só avança depois, então o
+    leitor detecta e descarta registros rasgados ou sobrescritos.
+    """
+    def __init__(self, nome=NOME_TELEMETRIA, capacidade=CAPACIDADE_PADRAO, campos=CAMPOS_TELEMETRIA):
+        self.campos = tuple(campos)
+        tamanho = CABECALHO.itemsize + capacidade * _dtype_registro(len(self.campos)).itemsize
+        try:
+            shm = shared_memory.SharedMemory(nome, create=True, size=tamanho)
+        except FileExistsError:
+            # Sobra de uma execução interrompida: recria com o layout atual
+            antigo = shared_memory.SharedMemory(nome)
+            antigo.close()
+            antigo.unlink()
+            shm = shared_memory.SharedMemory(nome, create=True, size=tamanho)
+        cabecalho = np.ndarray((), CABECALHO, buffer=shm.buf)
+        cabecalho["capacidade"] = capacidade
+        cabecalho["n_campos"] = len(self.campos)
+        cabecalho["escritos"] = 0
+        cabecalho["versao"] = VERSAO_LAYOUT
+        del cabecalho
+        self._mapear(shm)
+        self.escritos = 0
+        _publicados.add(shm.name)
+
+    def publicar(self, dados):
+        registro = self.registros[self.escritos % self.capacidade]
+        registro["seq"] = 2 * self.escritos + 1
+        registro["valores"] = [_numero(dados.get(campo, math.nan)) for campo in self.campos]
+        self.escritos += 1
+        registro["seq"] = 2 * self.escritos
+        self.cabecalho["escritos"] = self.escritos
+
+    def close(self):
+        self.cabecalho["versao"] = 0  # Avisa leitores ainda mapeados que o anel acabou
+        super().close()
+        self.shm.unlink()
+        _publicados.discard(self.shm.name)
+
+class LeitorTelemetria(_Anel):
+    """Lado do painel: lê os últimos registros do anel sem tocar no disco.
+
+    Levanta FileNotFoundError se o simulador não estiver publicando.
+    """
+    def __init__(self, nome=NOME_TELEMETRIA, campos=CAMPOS_TELEMETRIA):
+        # O resource_tracker apagaria o bloco ao fim deste processo, que só o usa
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(nome, track=False)
+        else:
+            shm = shared_memory.SharedMemory(nome)
+            if shm.name not in _publicados:
+                resource_tracker.unregister(shm._name, "shared_memory")
+        self.campos = tuple(campos)
+        self._mapear(shm)
+        if int(self.cabecalho["versao"]) != VERSAO_LAYOUT or \
+                int(self.cabecalho["n_campos"]) != len(self.campos):
+            self.close()
+            raise ValueError(f"Layout de telemetria incompatível em {nome}")
+
+    @property
+    def encerrado(self):
+        """O publicador fechou o anel (ex.: simulador reiniciado): é preciso reabrir"""
+        return int(self.cabecalho["versao"]) != VERSAO_LAYOUT
+
+    @property
+    def escritos(self):
+        return int(self.cabecalho["escritos"])
+
+    def ultimos(self, n=1):
+        """Matriz (linhas x campos) com até n registros mais recentes e íntegros.
+
+        A janela é copiada numa operação só (sem parse nem serialização) e
+        validada pelo seqlock: registros sobrescritos durante a cópia saem.
+        """
+        total = self.escritos
+        n = min(n, total, self.capacidade)
+        if n <= 0:
+            return np.empty((0, len(self.campos)))
+        indices = np.arange(total - n, total)
+        posicoes = indices % self.capacidade
+        antes = self.registros["seq"][posicoes]
+        valores = self.registros["valores"][posicoes]
+        depois = self.registros["seq"][posicoes]
+        esperado = 2 * (indices + 1)
+        return valores[(antes == esperado) & (depois == esperado)]
+
+    def ultimo(self):
+        """Registro mais recente como dict, ou None se ainda não há dados"""
+        linhas = self.ultimos(1)
+        return dict(zip(self.campos, linhas[-1])) if len(linhas) else None
+
+    def dataframe(self, n=CAPACIDADE_PADRAO):
+        return pd.DataFrame(self.ultimos(n), columns=self.campos)